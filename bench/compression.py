@@ -0,0 +1,52 @@
+"""
+Microbenchmark of RestishApp's response compression.
+
+Run from the top of the source tree:
+
+    python bench/compression.py [number]
+
+Prints the best of 5 runs, in microseconds per request, of a prebuilt ~28KB
+text/html str body sent without compression, gzipped, and gzipped with the
+Compressor's cache.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from restish import app, compression, http, resource
+
+
+BODY = open(os.path.join(os.path.dirname(__file__), os.pardir, 'restish',
+                         'url.py')).read()
+
+
+class Resource(resource.Resource):
+
+    def __call__(self, request):
+        return http.ok([('Content-Type', 'text/html')], BODY)
+
+
+def start_response(status, headers):
+    pass
+
+
+def main(number=1000):
+    environ = http.Request.blank('/', environ={
+        'HTTP_ACCEPT_ENCODING': 'gzip, deflate'}).environ
+    cases = [
+        ('no compression', None),
+        ('gzip', compression.Compressor()),
+        ('gzip + cache', compression.Compressor(cache_size=16)),
+        ]
+    for name, compressor in cases:
+        A = app.RestishApp(Resource(), compression=compressor)
+        func = lambda: ''.join(A(dict(environ), start_response))
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print '%-16s %8.2fus  %6d bytes' % (name, best / number * 1e6,
+                                             len(func()))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,43 @@
+"""
+Microbenchmark of _mimeparse.best_match.
+
+Run from the top of the source tree:
+
+    python bench/mimeparse.py [number]
+
+Prints the best of 3 runs, in best_match calls per second, of six supported
+types against five typical browser and XHR Accept headers.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from restish import _mimeparse
+
+
+HEADERS = [
+    'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,'
+        'image/apng,*/*;q=0.8',
+    'application/json, text/javascript, */*; q=0.01',
+    '*/*',
+    'text/*;q=0.3, text/html;q=0.7, text/html;level=1, '
+        'text/html;level=2;q=0.4, */*;q=0.5',
+    ]
+
+SUPPORTED = ['text/html', 'application/json', 'application/xml',
+             'text/plain', 'image/*', 'text/html;level=1']
+
+
+def main(number=2000):
+    def func():
+        for header in HEADERS:
+            _mimeparse.best_match(SUPPORTED, header)
+    best = min(timeit.repeat(func, number=number, repeat=3))
+    print '%.0f best_match calls/s' % (number * len(HEADERS) / best)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks of restish.url's path and query splitting and joining.
+
+Run from the top of the source tree:
+
+    python bench/quoting.py [--no-cache] [number]
+
+Prints the best of 5 runs, in microseconds per call, over 2000 realistic
+paths and queries: mostly short repeated tokens and numeric ids, with a few
+unicode and escaped items. --no-cache sets url.CACHE_SIZE to 0 to time the
+quoting without memoization.
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from restish import url
+
+
+TOKENS = ['users', 'items', 'edit', 'api', 'v1', 'orders', 'search',
+          'static', 'css', 'page']
+
+
+def segment():
+    r = random.random()
+    if r < 0.6:
+        return random.choice(TOKENS)
+    if r < 0.9:
+        return str(random.randint(1, 500))
+    if r < 0.97:
+        return u'caf\xe9'
+    return 'a b'
+
+
+def query_item():
+    return (random.choice(['q', 'page', 'sort']),
+            random.choice(['name', '1', '2', u'\xe9t\xe9', 'a b']))
+
+
+def main(number=20):
+    random.seed(0)
+    paths = [[segment() for i in range(random.randint(1, 5))]
+             for j in range(2000)]
+    queries = [[query_item() for i in range(random.randint(0, 3))]
+               for j in range(2000)]
+    joined_paths = [url.join_path(path) for path in paths]
+    joined_queries = [url.join_query(query) for query in queries]
+    cases = [
+        ('join_path', lambda: [url.join_path(p) for p in paths]),
+        ('split_path', lambda: [url.split_path(p) for p in joined_paths]),
+        ('join_query', lambda: [url.join_query(q) for q in queries]),
+        ('split_query', lambda: [url.split_query(q) for q in joined_queries]),
+        ]
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print '%-12s %6.2fus' % (name, best / number / 2000 * 1e6)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if '--no-cache' in args:
+        args.remove('--no-cache')
+        url.CACHE_SIZE = 0
+    main(*[int(arg) for arg in args[:1]])
@@ -0,0 +1,68 @@
+"""
+Microbenchmarks of http.Request and http.LazyRequest, alone and through
+RestishApp.
+
+Run from the top of the source tree:
+
+    python bench/request.py [number]
+
+Prints the best of several runs, in microseconds, of creating a request and
+reading its method, and of 404 (traversal), 304 and cached child 200
+requests with and without RestishApp's lazy_request.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from restish import app, http, resource
+
+
+class Leaf(resource.Resource):
+
+    @resource.GET(etag=lambda resource, request: 'v1')
+    def GET(self, request):
+        return http.ok([('Content-Type', 'text/plain')], 'leaf')
+
+
+class Root(resource.Resource):
+
+    @resource.child('a/{b}')
+    @resource.cacheable
+    def a(self, request, segments, b):
+        return Leaf()
+
+
+CASES = [
+    ('404', '/missing/x', {}),
+    ('304', '/a/1', {'If-None-Match': '"v1"'}),
+    ('cached child 200', '/a/1', {}),
+    ]
+
+
+def start_response(status, headers):
+    pass
+
+
+def main(number=1000):
+    environ = http.Request.blank('/a/1').environ
+    for factory in [http.Request, http.LazyRequest]:
+        func = lambda: factory(environ).method
+        best = min(timeit.repeat(func, number=number * 10, repeat=5))
+        print '%-26s %6.2fus' % (factory.__name__ + '().method',
+                                 best / (number * 10) * 1e6)
+    apps = [(lazy, app.RestishApp(Root(), child_cache_size=100,
+                                  lazy_request=lazy))
+            for lazy in [False, True]]
+    for name, path, headers in CASES:
+        environ = http.Request.blank(path, headers=headers).environ
+        for lazy, A in apps:
+            func = lambda: list(A(dict(environ), start_response))
+            best = min(timeit.repeat(func, number=number, repeat=10))
+            label = '%s (%s)' % (name, lazy and 'lazy' or 'eager')
+            print '%-26s %6.2fus' % (label, best / number * 1e6)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
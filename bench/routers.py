@@ -0,0 +1,44 @@
+"""
+Microbenchmarks of the child routers.
+
+Run from the top of the source tree:
+
+    python bench/routers.py [number]
+
+Prints the best of 3 runs, in microseconds per compiled_child_router call, of
+a resource with 40 'itemN/{id}' children, for a hit on the first child, the
+worst case of the linear router, and a miss.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from restish import resource
+
+
+def make(router, children=40):
+    attrs = {'child_router': router}
+    for i in range(children):
+        def factory(self, request, segments, **kwargs):
+            return self
+        attrs['child%d' % i] = resource.child('item%d/{id}' % i)(factory)
+    return resource._metaResource('Resource', (resource.Resource,), attrs)()
+
+
+def main(number=20000):
+    for router in [resource.LinearChildRouter, resource.RegexChildRouter,
+                   resource.TrieChildRouter]:
+        R = make(router)
+        timings = []
+        for segments in [[u'item0', u'5'], [u'missing', u'x']]:
+            func = lambda: R.compiled_child_router(None, segments)
+            best = min(timeit.repeat(func, number=number, repeat=3))
+            timings.append(best / number * 1e6)
+        print '%-18s worst hit %6.2fus  miss %6.2fus' % \
+                ((router.__name__,) + tuple(timings))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,47 @@
+"""
+Microbenchmarks of restish.url's hot URL methods.
+
+Run from the top of the source tree:
+
+    python bench/url.py [number]
+
+Prints the best of 5 runs, in microseconds per call, for each case.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from restish import url
+
+
+BASE = url.URL('http://example.com/app/users/42?page=2&sort=name')
+
+CASES = [
+    ('URL()', lambda: url.URL('http://example.com/app/users/42?page=2')),
+    ('child', lambda: BASE.child('posts')),
+    ('child x3 chained', lambda: BASE.child('a').child('b').child('c')),
+    ('sibling', lambda: BASE.sibling('43')),
+    ('parent', lambda: BASE.parent()),
+    ('add_query', lambda: BASE.add_query('q', 'x')),
+    ('add_query x3 chained',
+     lambda: BASE.add_query('a', '1').add_query('b', '2').add_query('c', '3')),
+    ('replace_query', lambda: BASE.replace_query('page', '3')),
+    ('remove_query', lambda: BASE.remove_query('sort')),
+    ('clone', lambda: BASE.clone(fragment='top')),
+    ('path_segments', lambda: BASE.path_segments),
+    ('query_list', lambda: BASE.query_list),
+    ('path', lambda: BASE.path),
+    ('hash', lambda: hash(url.URL('http://example.com/app/users/42'))),
+    ]
+
+
+def main(number=5000):
+    for name, func in CASES:
+        best = min(timeit.repeat(func, number=number, repeat=5))
+        print '%-22s %8.2fus' % (name, best / number * 1e6)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -16,7 +16,9 @@ Contents:
 
 ====
 mimeparse.py, apart from the addition of this section of the module's header
-docstring, is taken wholesale from http://code.google.com/p/mimeparse/.
+docstring, is taken from http://code.google.com/p/mimeparse/. It has been
+changed to cache parsed headers and mime-types and to avoid building lists in
+the fitness calculation; the public functions return exactly what they did.
 mimeparse has the MIT license as follows:
 
 The MIT License
@@ -47,6 +49,13 @@ __author__ = 'Joe Gregorio'
 __email__ = "joe@bitworking.org"
 __credits__ = ""
 
+# Maximum number of parsed headers and mime-types to cache. Each cache is
+# simply emptied when full.
+CACHE_SIZE = 512
+
+_parsed_headers = {}
+_parsed_mime_types = {}
+
 def parse_mime_type(mime_type):
     """Carves up a mime-type and returns a tuple of the
        (type, subtype, params) where 'params' is a dictionary
@@ -94,25 +103,58 @@ def fitness_and_quality_parsed(mime_type, parsed_ranges):
        parameter of the best match, or (-1, 0) if no match
        was found. Just as for quality_parsed(), 'parsed_ranges'
        must be a list of parsed media ranges. """
+    return _fitness_and_quality(_parse_mime_type(mime_type), parsed_ranges)
+
+def _fitness_and_quality(target, parsed_ranges):
+    """Same as fitness_and_quality_parsed() except the mime-type must
+       have been parsed by _parse_mime_type(). """
     best_fitness = -1 
     best_fit_q = 0
-    (target_type, target_subtype, target_params) =\
-            parse_media_range(mime_type)
+    (target_type, target_subtype, target_params) = target
     for (type, subtype, params) in parsed_ranges:
         if (type == target_type or type == '*' or target_type == '*') and \
                 (subtype == target_subtype or subtype == '*' or target_subtype == '*'):
-            param_matches = reduce(lambda x, y: x+y, [1 for (key, value) in \
-                    target_params.iteritems() if key != 'q' and \
-                    params.has_key(key) and value == params[key]], 0)
             fitness = (type == target_type) and 100 or 0
             fitness += (subtype == target_subtype) and 10 or 0
-            fitness += param_matches
+            for (key, value) in target_params:
+                if key in params and value == params[key]:
+                    fitness += 1
             if fitness > best_fitness:
                 best_fitness = fitness
                 best_fit_q = params['q']
             
     return best_fitness, float(best_fit_q)
 
+def _parse_mime_type(mime_type):
+    """Parse a mime-type, as parse_media_range() does, returning a
+       (type, subtype, params) tuple where params is a tuple of the
+       (key, value) parameters except 'q'. Results are cached. """
+    try:
+        return _parsed_mime_types[mime_type]
+    except KeyError:
+        pass
+    (type, subtype, params) = parse_media_range(mime_type)
+    params = tuple([(key, value) for (key, value) in params.iteritems() \
+            if key != 'q'])
+    if len(_parsed_mime_types) >= CACHE_SIZE:
+        _parsed_mime_types.clear()
+    parsed = _parsed_mime_types[mime_type] = (type, subtype, params)
+    return parsed
+
+def _parse_header(header):
+    """Parse the comma-separated media-ranges of a header, returning
+       a tuple of parsed media ranges. Results are cached and must not
+       be modified. """
+    try:
+        return _parsed_headers[header]
+    except KeyError:
+        pass
+    parsed = tuple([parse_media_range(r) for r in header.split(",")])
+    if len(_parsed_headers) >= CACHE_SIZE:
+        _parsed_headers.clear()
+    _parsed_headers[header] = parsed
+    return parsed
+
 def quality_parsed(mime_type, parsed_ranges):
     """Find the best match for a given mime-type against
     a list of media_ranges that have already been
@@ -131,8 +173,7 @@ def quality(mime_type, ranges):
     0.7
     
     """ 
-    parsed_ranges = [parse_media_range(r) for r in ranges.split(",")]
-    return quality_parsed(mime_type, parsed_ranges)
+    return quality_parsed(mime_type, _parse_header(ranges))
 
 def best_match(supported, header):
     """Takes a list of supported mime-types and finds the best
@@ -144,11 +185,16 @@ def best_match(supported, header):
     >>> best_match(['application/xbel+xml', 'text/xml'], 'text/*;q=0.5,*/*; q=0.1')
     'text/xml'
     """
-    parsed_header = [parse_media_range(r) for r in header.split(",")]
-    weighted_matches = [(fitness_and_quality_parsed(mime_type, parsed_header), mime_type)\
-            for mime_type in supported]
-    weighted_matches.sort()
-    return weighted_matches[-1][0][1] and weighted_matches[-1][1] or ''
+    parsed_header = _parse_header(header)
+    best = None
+    for mime_type in supported:
+        weighted_match = (_fitness_and_quality(_parse_mime_type(mime_type), \
+                parsed_header), mime_type)
+        if best is None or weighted_match > best:
+            best = weighted_match
+    if best is None:
+        raise IndexError('list index out of range')
+    return best[0][1] and best[1] or ''
 
 if __name__ == "__main__":
     import unittest
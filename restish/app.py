@@ -1,27 +1,188 @@
 """
 Core wsgi application
 """
-from restish import error, http, url
+import threading
+
+from restish import error, http, instrumentation, resource, url, util
 
 
 class RestishApp(object):
+    """
+    WSGI application that traverses the resource hierarchy, from the root
+    resource, to find and call the resource for the request.
+
+    :arg root_resource:
+        Resource at the root of the application's URL space.
+    :arg child_cache_size:
+        Optional maximum number of child lookups to cache, see
+        resource.cacheable. Defaults to None, i.e. no cache. A lookup is
+        cached for the resource and the whole remaining path, so size the
+        cache for the number of distinct cacheable paths, not resources.
+    :arg not_found_cache_size:
+        Optional maximum number of paths, not found when traversing the
+        resource hierarchy, to cache. Requests for a cached path are sent a 404
+        without traversing the resource hierarchy again. Defaults to None,
+        i.e. no cache.
+    :arg not_found_ttl:
+        Number of seconds a path is cached as not found, defaults to 60.
+    :arg instrumentation:
+        Optional instrumentation sink called back at the start and stop of
+        each phase of a request, see the instrumentation module. Defaults to
+        None, i.e. no instrumentation.
+    :arg lazy_request:
+        Optional flag to pass resources an http.LazyRequest, which builds the
+        full http.Request only when needed, instead of an http.Request.
+        Defaults to False.
+    :arg max_path_length:
+        Optional maximum length of the request's path (PATH_INFO).
+    :arg max_path_segments:
+        Optional maximum number of segments in the request's path.
+    :arg max_query_length:
+        Optional maximum length of the request's query string.
+    :arg max_query_params:
+        Optional maximum number of query arguments, counted by their '&'
+        separators as url.split_query splits them.
+    :arg max_header_length:
+        Optional maximum length of each of the negotiation_headers.
+    :arg compression:
+        Optional compression.Compressor used to compress response bodies for
+        clients that accept it. Defaults to None, i.e. no compression.
+
+    Requests over a limit are sent a 400 Bad Request before the path or query
+    is decoded or the resource hierarchy traversed. The number of requests
+    rejected by each limit, named by the argument without the 'max_' prefix,
+    is counted in the rejected dict to help spot abuse. The limits default to
+    None, i.e. unlimited.
+    """
+
+    # Paths longer than this are never cached as not found to limit the memory
+    # used by the cache.
+    not_found_max_path_length = 1024
 
-    def __init__(self, root_resource):
+    # Headers parsed to negotiate the response, limited by max_header_length.
+    negotiation_headers = ('HTTP_ACCEPT', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH',
+                           'HTTP_IF_MODIFIED_SINCE')
+
+    def __init__(self, root_resource, child_cache_size=None,
+                 not_found_cache_size=None, not_found_ttl=60,
+                 instrumentation=None, lazy_request=False,
+                 max_path_length=None, max_path_segments=None,
+                 max_query_length=None, max_query_params=None,
+                 max_header_length=None, compression=None):
         self.root = root_resource
+        self.compression = compression
+        self.max_path_length = max_path_length
+        self.max_path_segments = max_path_segments
+        self.max_query_length = max_query_length
+        self.max_query_params = max_query_params
+        self.max_header_length = max_header_length
+        self.rejected = {'path_length': 0, 'path_segments': 0,
+                         'query_length': 0, 'query_params': 0,
+                         'header_length': 0}
+        self._rejected_lock = threading.Lock()
+        self._limited = [max_path_length, max_path_segments, max_query_length,
+                         max_query_params, max_header_length] != [None] * 5
+        response = http.bad_request()
+        self._bad_request = (response.status, response.headerlist,
+                             response.body)
+        self.instrumentation = instrumentation
+        if lazy_request:
+            self.request_factory = http.LazyRequest
+        else:
+            self.request_factory = http.Request
+        if child_cache_size is None:
+            self.child_cache = None
+        else:
+            self.child_cache = util.LRUCache(child_cache_size)
+        if not_found_cache_size is None:
+            self.not_found_cache = None
+        else:
+            self.not_found_cache = util.LRUCache(not_found_cache_size,
+                                                 ttl=not_found_ttl)
+            response = http.not_found()
+            self._not_found = (response.status, response.headerlist,
+                               response.body)
 
     def __call__(self, environ, start_response):
+        # Reject requests over a limit before doing any real work.
+        if self._limited:
+            limit = self.exceeded_limit(environ)
+            if limit is not None:
+                self._rejected_lock.acquire()
+                try:
+                    self.rejected[limit] += 1
+                finally:
+                    self._rejected_lock.release()
+                return _prebuilt(environ, start_response, self._bad_request)
+        # Send a 404 for paths already known to be not found.
+        if self.not_found_cache is not None and \
+                self.not_found_cache.get(environ['PATH_INFO']):
+            return _prebuilt(environ, start_response, self._not_found)
         # Create a request object.
-        request = http.Request(environ)
+        request = self.request_factory(environ)
+        if self.instrumentation is None:
+            trace = None
+        else:
+            trace = instrumentation.Trace(self.instrumentation, request)
+            environ['restish.instrumentation'] = trace
+        located = None
         try:
-            # Locate the resource.
-            resource = self.locate_resource(request)
-            # Call the resource to render the page.
-            response = self.get_response(request, resource)
+            if trace is None:
+                # Locate the resource.
+                located = self.locate_resource(request)
+                # Call the resource to render the page.
+                response = self.get_response(request, located)
+            else:
+                located = trace.call('locate_resource', None,
+                                     self.locate_resource, request)
+                response = trace.call('get_response', located,
+                                      self.get_response, request, located)
         except error.HTTPError, e:
             response = e.make_response()
+        # Send only the requested byte ranges of the body.
+        if 'HTTP_RANGE' in environ and environ['REQUEST_METHOD'] == 'GET':
+            response = http.range_response(environ, response)
+        # Compress the body for clients that accept it.
+        if self.compression is not None:
+            response = self.compression.compress(environ, response)
         # Send the response to the WSGI parent.
         start_response(response.status, response.headerlist)
-        return response.app_iter
+        # Never send a body in response to a HEAD request.
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return _no_body(response.app_iter)
+        app_iter = response.app_iter
+        # Let the server send files its own way, e.g. using sendfile.
+        if isinstance(app_iter, http.FileIter) and \
+                'wsgi.file_wrapper' in environ:
+            return environ['wsgi.file_wrapper'](app_iter.file,
+                                                app_iter.block_size)
+        if trace is not None:
+            return trace.app_iter(located, app_iter)
+        return app_iter
+
+    def exceeded_limit(self, environ):
+        """
+        Return the name of the first limit the request is over, or None.
+        """
+        path = environ.get('PATH_INFO', '')
+        if self.max_path_length is not None and \
+                len(path) > self.max_path_length:
+            return 'path_length'
+        if self.max_path_segments is not None and \
+                path.count('/') > self.max_path_segments:
+            return 'path_segments'
+        query = environ.get('QUERY_STRING', '')
+        if self.max_query_length is not None and \
+                len(query) > self.max_query_length:
+            return 'query_length'
+        if self.max_query_params is not None and query and \
+                query.count('&') + 1 > self.max_query_params:
+            return 'query_params'
+        if self.max_header_length is not None:
+            for key in self.negotiation_headers:
+                if len(environ.get(key, '')) > self.max_header_length:
+                    return 'header_length'
+        return None
 
     def locate_resource(self, request):
         """
@@ -35,23 +196,60 @@ class RestishApp(object):
         if segments == ['']:
             segments = []
         # Recurse into the resource hierarchy until we run out of segments.
-        resource = self.root
+        # Child lookups are only cached while the resource is one that's
+        # shared between requests, i.e. the root or a cached child.
+        child_cache = self.child_cache
+        cached = child_cache is not None
+        trace = request.environ.get('restish.instrumentation')
+        current = self.root
         while segments:
-            resource_child = getattr(resource, 'resource_child', None)
+            if cached:
+                # Keyed on the whole remaining path, not just the segments
+                # the child consumes: which child matches may depend on the
+                # later segments, e.g. '{id}' and '{id}/edit'.
+                key = (current, tuple(segments))
+                result = child_cache.get(key)
+                if result is not None:
+                    current, segments = result[0], list(result[1])
+                    if trace is not None:
+                        trace.route.append(result[2] or '*')
+                    continue
+            resource_child = getattr(current, 'resource_child', None)
             # No resource_child method? 404.
             if resource_child is None:
-                raise http.NotFoundError()
-            result = resource_child(request, segments)
+                self._not_found_error(request)
+            if trace is None:
+                result = resource_child(request, segments)
+            else:
+                result = trace.resource_child(current, resource_child,
+                                              request, segments)
             # No result returned? 404.
             if result is None:
-                raise http.NotFoundError()
+                self._not_found_error(request)
+            if cached:
+                cached = resource.is_cacheable_child(result)
             # Either aa (resource, remaining segments) tuple or an object to
             # forward the lookup to is acceptable.
             if isinstance(result, tuple):
-                resource, segments = result
+                current, segments = result
             else:
-                resource = result
-        return resource
+                current = result
+            if cached:
+                # The matched pattern is only known when instrumented.
+                pattern = trace is not None and trace.pattern or None
+                child_cache[key] = (current, tuple(segments), pattern)
+        return current
+
+    def _not_found_error(self, request):
+        """
+        Remember the request's path was not found, if there is a cache, and
+        raise a NotFoundError.
+        """
+        path = request.environ['PATH_INFO']
+        if self.not_found_cache is not None and \
+                len(path) <= self.not_found_max_path_length:
+            self.not_found_cache[path] = True
+        raise http.NotFoundError()
 
     def get_response(self, request, resource):
         """
@@ -67,3 +265,24 @@ class RestishApp(object):
             resource = response
         return response
 
+
+def _prebuilt(environ, start_response, response):
+    """
+    Send a prebuilt (status, headerlist, body) response, without its body in
+    response to a HEAD request.
+    """
+    status, headerlist, body = response
+    start_response(status, list(headerlist))
+    if environ['REQUEST_METHOD'] == 'HEAD':
+        return _no_body(None)
+    return [body]
+
+
+def _no_body(app_iter):
+    """
+    Discard the app_iter without iterating it, returning an empty body.
+    """
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+    return []
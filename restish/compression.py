@@ -0,0 +1,233 @@
+"""
+Response compression.
+
+A Compressor, installed with RestishApp's compression argument, compresses
+response bodies with the gzip or deflate content coding, whichever the client
+prefers according to its Accept-Encoding header.
+
+A str body is compressed in one go, and the compressed bytes optionally
+cached, and sent with a Content-Length. Any other body is compressed
+incrementally as the WSGI server iterates it, without a Content-Length, and
+by default flushed after each chunk so a streamed page's early chunks reach
+the client without waiting for the compressor's buffer to fill.
+
+Responses are not compressed if:
+
+  * they are to a HEAD request, so have no body to compress;
+  * they have no body, i.e. 204 No Content and 304 Not Modified, or are a
+    206 Partial Content of the uncompressed body;
+  * they already have a Content-Encoding, e.g. a precompressed file;
+  * their Content-Type is not one of the compressible types, e.g. images and
+    archives that are already compressed;
+  * their Content-Length is less than the minimum size.
+
+Compressible responses are sent with 'Accept-Encoding' in their Vary header,
+even when not compressed, and the ETag of a compressed response is made weak
+as the compressed bytes may differ from one compression to the next.
+"""
+import zlib
+
+from webob.acceptparse import Accept
+
+from restish import http, util
+
+
+# zlib wbits for each content coding.
+_WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+class Compressor(object):
+    """
+    Compressor of responses.
+
+    :arg level:
+        zlib compression level, 1 (fastest) to 9 (smallest), defaults to 6.
+    :arg min_size:
+        Content-Length, in bytes, below which a response is not compressed,
+        defaults to 1024.
+    :arg cache_size:
+        Optional maximum number of compressed str bodies to cache. Defaults to
+        None, i.e. no cache.
+    :arg cache_bytes:
+        Maximum total size, in bytes, of the cached bodies and their
+        compressed bytes, defaults to 4MB.
+    :arg max_cached_body_size:
+        Size, in bytes, of the largest str body whose compressed bytes are
+        cached, defaults to 256KB.
+    :arg sync_flush:
+        Flag to flush the compressed output after each chunk of an app_iter
+        body, defaults to True. Turning it off compresses streamed bodies a
+        little better but holds back their output until the compressor's
+        buffer fills.
+
+    The cache is for bodies that are reused, e.g. prebuilt module-level
+    strings. Bodies are looked up by identity, i.e. the same str object, which
+    is cheap whatever the body's size. The cache keeps a reference to each
+    body, so that its id can't be reused by another body, which is counted in
+    cache_bytes. Bodies built for each request never hit the cache.
+    """
+
+    # Prefixes and suffixes of compressible media types.
+    types = ('text/', 'application/json', 'application/javascript',
+             'application/x-javascript', 'application/xml',
+             'application/xhtml+xml', 'image/svg+xml')
+    type_suffixes = ('+xml', '+json')
+
+    def __init__(self, level=6, min_size=1024, cache_size=None,
+                 cache_bytes=4 * 1024 * 1024, max_cached_body_size=256 * 1024,
+                 sync_flush=True):
+        self.level = level
+        self.min_size = min_size
+        self.max_cached_body_size = max_cached_body_size
+        self.sync_flush = sync_flush
+        if cache_size is None:
+            self.cache = None
+        else:
+            self.cache = util.LRUCache(cache_size, maxbytes=cache_bytes,
+                                       sizeof=_cached_size)
+
+    def compressible(self, response):
+        """
+        Test if the response's body should be compressed for a client that
+        accepts it.
+        """
+        status = response.status_int
+        if status < 200 or status in (204, 206, 304):
+            return False
+        headers = response.headers
+        if 'Content-Encoding' in headers:
+            return False
+        content_type = headers.get('Content-Type')
+        if not content_type:
+            return False
+        content_type = content_type.split(';', 1)[0].strip().lower()
+        if not content_type.startswith(self.types) and \
+                not content_type.endswith(self.type_suffixes):
+            return False
+        content_length = headers.get('Content-Length')
+        if content_length is not None and content_length.isdigit() and \
+                int(content_length) < self.min_size:
+            return False
+        return True
+
+    def compress(self, environ, response):
+        """
+        Return the response compressed with the content coding preferred by
+        the environ's Accept-Encoding header, or the response itself.
+        """
+        # A HEAD response has no body, and the Content-Length of the body it
+        # would have, so is never compressed.
+        if environ.get('REQUEST_METHOD') == 'HEAD' or \
+                not self.compressible(response):
+            return response
+        headers = [(name, value) for (name, value) in response.headerlist
+                   if name.lower() != 'vary']
+        headers.append(('Vary', _vary(response.headers.get('Vary'))))
+        coding = _coding(environ.get('HTTP_ACCEPT_ENCODING'))
+        if coding is None:
+            response.headerlist[:] = headers
+            return response
+        # The length changes and byte ranges of the compressed body are not
+        # supported.
+        headers = [(name, value) for (name, value) in headers
+                   if name.lower() not in ('content-length', 'accept-ranges')]
+        headers.append(('Content-Encoding', coding))
+        for i, (name, value) in enumerate(headers):
+            if name.lower() == 'etag' and not value.startswith('W/'):
+                headers[i] = (name, 'W/' + value)
+        app_iter = response.app_iter
+        if isinstance(app_iter, list) and len(app_iter) == 1 and \
+                isinstance(app_iter[0], str):
+            body = self._compress_body(coding, app_iter[0])
+            headers.append(('Content-Length', str(len(body))))
+        else:
+            body = _CompressedAppIter(app_iter, coding, self.level,
+                                      self.sync_flush)
+        return http.Response(response.status, headers, body)
+
+    def _compress_body(self, coding, body):
+        """
+        Compress the str body, using the cache if there is one.
+        """
+        if self.cache is None or len(body) > self.max_cached_body_size:
+            return _compress(coding, self.level, body)
+        key = (coding, id(body), len(body))
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] is body:
+            return cached[1]
+        compressed = _compress(coding, self.level, body)
+        self.cache[key] = (body, compressed)
+        return compressed
+
+
+def _coding(accept_encoding):
+    """
+    Return the content coding, 'gzip' or 'deflate', preferred by the
+    Accept-Encoding header, or None if neither is acceptable.
+    """
+    if not accept_encoding:
+        return None
+    accept = Accept('Accept-Encoding', accept_encoding)
+    gzip, deflate = accept.quality('gzip') or 0, accept.quality('deflate') or 0
+    if not (gzip or deflate):
+        return None
+    if gzip >= deflate:
+        return 'gzip'
+    return 'deflate'
+
+
+def _vary(vary):
+    """
+    Return the Vary header value with Accept-Encoding added.
+    """
+    if not vary:
+        return 'Accept-Encoding'
+    names = [name.strip().lower() for name in vary.split(',')]
+    if '*' in names or 'accept-encoding' in names:
+        return vary
+    return vary + ', Accept-Encoding'
+
+
+def _cached_size(cached):
+    """
+    Return the size of a cached (body, compressed) tuple.
+    """
+    return len(cached[0]) + len(cached[1])
+
+
+def _compress(coding, level, body):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS[coding])
+    return compressor.compress(body) + compressor.flush()
+
+
+class _CompressedAppIter(object):
+    """
+    app_iter wrapper that compresses the app_iter's chunks as they are
+    iterated.
+    """
+
+    def __init__(self, app_iter, coding, level, sync_flush=True):
+        self.app_iter = app_iter
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                           _WBITS[coding])
+        self.sync_flush = sync_flush
+
+    def __iter__(self):
+        compressor = self.compressor
+        sync_flush = self.sync_flush
+        for chunk in self.app_iter:
+            if not chunk:
+                continue
+            chunk = compressor.compress(chunk)
+            if sync_flush:
+                # Send everything compressed so far, ending on a byte
+                # boundary the client can decompress up to.
+                chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    def close(self):
+        close = getattr(self.app_iter, 'close', None)
+        if close is not None:
+            close()
@@ -33,7 +33,16 @@ function, e.g.
                                         
     <a href="{{app_urls.news_item(3)}}">News item #3</a>.
 
+Alternatively, RouteURLAccessor builds the URLs of the named routes of the
+application's resources (see restish.resource.Routes) with the request bound
+to the call:
+
+    args['route_url'] = RouteURLAccessor(request)
+
+    <a href="{{route_url('news_item', id=3)}}">News item #3</a>.
+
 """
+from restish import resource
 
 
 class ApplicationURLAccessor(object):
@@ -68,3 +77,24 @@ class ApplicationURLAccessor(object):
         func = getattr(self.module, name)
         return lambda *args, **kwargs: func(self.request, *args, **kwargs)
 
+
+class RouteURLAccessor(object):
+    """
+    Build the URL of a named route, relative to the web server root, with the
+    request bound to the call.
+
+    :arg request:
+        The request to build URLs for.
+    :arg routes:
+        Optional restish.resource.Routes registry, defaults to the routes
+        registered by the application's resources.
+    """
+
+    def __init__(self, request, routes=None):
+        self.request = request
+        if routes is None:
+            routes = resource.routes
+        self.routes = routes
+
+    def __call__(self, name, **params):
+        return self.routes.url(self.request, name, **params)
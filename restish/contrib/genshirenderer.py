@@ -23,6 +23,9 @@ method ("xml", "xhtml", "html", "text", etc) to be specified. Think carefully
 before using this class.
 """
 
+import codecs
+
+from genshi.output import TextSerializer
 from genshi.template.loader import TemplateLoader
 
 
@@ -34,3 +37,18 @@ class GenshiRenderer(object):
     def __call__(self, template, args={}, encoding=None):
         return self.loader.load(template).generate(**args).render(encoding=encoding)
 
+    def stream(self, template, args={}, encoding=None):
+        """
+        Render the template as it's iterated, serializing Genshi's stream.
+        """
+        stream = self.loader.load(template).generate(**args)
+        # Serialize, and encode, the same way as Stream.render.
+        method = stream.serializer or 'xml'
+        pieces = stream.serialize(method=method)
+        if encoding is None:
+            return pieces
+        if method == 'text' or isinstance(method, TextSerializer):
+            errors = 'replace'
+        else:
+            errors = 'xmlcharrefreplace'
+        return codecs.iterencode(pieces, encoding, errors)
@@ -21,6 +21,8 @@ e.g.
         )
 """
 
+import codecs
+
 import jinja2
 
 
@@ -35,3 +37,15 @@ class Jinja2Renderer(object):
             return template.render(**args)
         return template.render(**args).encode(encoding)
 
+    def stream(self, template, args={}, encoding=None):
+        """
+        Render the template as it's iterated, using Jinja2's generate().
+        """
+        template = self.environment.get_template(template)
+        pieces = template.generate(**args)
+        if encoding is None:
+            return pieces
+        # Encoded incrementally, so the output is the same as render's, e.g.
+        # only one BOM for utf-16.
+        return codecs.iterencode(pieces, encoding)
+
@@ -0,0 +1,285 @@
+"""
+Resource that serves the files in a directory, e.g. an application's public
+static assets.
+
+A StaticResource is shared between requests, to share its caches, and used
+as the target of an @child, consuming the remaining path segments:
+
+    static = StaticResource(
+        pkg_resources.resource_filename('yourpackage', 'public'))
+
+    class Root(resource.Resource):
+
+        @resource.child('static')
+        def static(self, request, segments):
+            return static
+
+The stat results of the files, and the content of small files, are cached in
+an LRU cache bounded by both the number of files and the total size of their
+content. Paths that are not found are not cached. Cached files are checked
+for changes using inotify, if the optional pyinotify package is installed,
+otherwise by polling, i.e. by checking the file's stat again once the entry
+is older than poll_interval seconds.
+
+A file with a precompressed sidecar file, the file's name with '.gz' added,
+is sent as the sidecar file, with a 'gzip' Content-Encoding, to clients that
+accept the gzip encoding.
+"""
+from datetime import datetime
+from email.utils import formatdate
+import mimetypes
+import os
+import stat
+import time
+
+from webob.acceptparse import Accept
+
+from restish import http, resource, util
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+class StaticResource(resource.Resource):
+    """
+    Resource serving the files in a directory.
+
+    :arg directory:
+        Directory of files to serve.
+    :arg cache_size:
+        Maximum number of files to cache, defaults to 1024.
+    :arg max_cache_bytes:
+        Maximum total size, in bytes, of the cached content, defaults to 16MB.
+    :arg max_cached_file_size:
+        Maximum size, in bytes, of a file whose content is cached, defaults to
+        64KB. Larger files are sent using http.file_response.
+    :arg poll_interval:
+        Number of seconds a cached file is used before checking it for
+        changes when not watching with inotify, defaults to 2.
+    :arg watch:
+        Flag to watch the directory for changes with inotify, when pyinotify
+        is installed. Defaults to True.
+    """
+
+    def __init__(self, directory, cache_size=1024,
+                 max_cache_bytes=16 * 1024 * 1024,
+                 max_cached_file_size=64 * 1024, poll_interval=2, watch=True):
+        self.directory = os.path.abspath(directory)
+        self.max_cached_file_size = max_cached_file_size
+        self.cache = util.LRUCache(cache_size, maxbytes=max_cache_bytes,
+                                   sizeof=_cached_bytes)
+        self._notifier = None
+        if watch and pyinotify is not None:
+            self._watch()
+            self.poll_interval = None
+        else:
+            self.poll_interval = poll_interval
+
+    def _watch(self):
+        """
+        Watch the directory with inotify, discarding the cached entry of any
+        file that changes.
+        """
+        mask = pyinotify.IN_ATTRIB | pyinotify.IN_CLOSE_WRITE | \
+                pyinotify.IN_CREATE | pyinotify.IN_DELETE | \
+                pyinotify.IN_DELETE_SELF | pyinotify.IN_MODIFY | \
+                pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO
+        manager = pyinotify.WatchManager()
+        self._notifier = pyinotify.ThreadedNotifier(manager, self._changed)
+        self._notifier.setDaemon(True)
+        self._notifier.start()
+        manager.add_watch(self.directory, mask, rec=True, auto_add=True)
+
+    def _changed(self, event):
+        """
+        inotify event handler.
+        """
+        if event.dir:
+            # A whole directory may have come or gone.
+            self.cache.clear()
+            return
+        path = event.pathname
+        if path.endswith('.gz'):
+            # Also discard the file the sidecar belongs to.
+            self.cache.pop(path[:-3], None)
+        self.cache.pop(path, None)
+
+    def close(self):
+        """
+        Stop watching the directory.
+        """
+        if self._notifier is not None:
+            self._notifier.stop()
+            self._notifier = None
+
+    def resource_child(self, request, segments):
+        path = self._path(segments)
+        if path is None:
+            return None
+        return (lambda request: self.serve(request, path)), []
+
+    def __call__(self, request):
+        # Directories are not listed.
+        return http.not_found()
+
+    def _path(self, segments):
+        """
+        Return the path of the file for the segments, or None if the segments
+        are not for a file inside the directory.
+        """
+        for segment in segments:
+            if segment in ('', '.', '..') or '/' in segment or \
+                    os.sep in segment or '\0' in segment:
+                return None
+        try:
+            segments = [segment.encode('utf-8') for segment in segments]
+        except UnicodeError:
+            return None
+        return os.path.join(self.directory, *segments)
+
+    def serve(self, request, path):
+        """
+        Return the response for the file at path.
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return http.method_not_allowed('GET, HEAD')
+        entry = self._entry(path)
+        if not entry.exists:
+            return http.not_found()
+        headers = []
+        if entry.gzip is not None:
+            headers.append(('Vary', 'Accept-Encoding'))
+            accept_encoding = request.environ.get('HTTP_ACCEPT_ENCODING')
+            if accept_encoding and \
+                    Accept('Accept-Encoding', accept_encoding).quality('gzip'):
+                entry = entry.gzip
+                headers.append(('Content-Encoding', 'gzip'))
+        headers.extend(entry.headers)
+        if resource._not_modified(request, entry.etag, entry.last_modified):
+            return http.not_modified([header for header in headers
+                                      if header[0] in ('Vary', 'ETag')])
+        if entry.body is not None:
+            headers.append(('Content-Length', str(len(entry.body))))
+            return http.ok(headers, entry.body)
+        try:
+            f = open(entry.path, 'rb')
+        except IOError:
+            # Gone since it was cached.
+            self.cache.pop(path, None)
+            return http.not_found()
+        return http.file_response(f, headers)
+
+    def _entry(self, path):
+        """
+        Return the _Entry for the file at path, from the cache if it's current.
+        """
+        entry = self.cache.get(path)
+        if entry is not None:
+            if self.poll_interval is None or \
+                    time.time() - entry.checked < self.poll_interval:
+                return entry
+            if entry.stat_key == _stat_key(path) and \
+                    entry.gzip_stat_key == _stat_key(path + '.gz'):
+                entry.checked = time.time()
+                return entry
+        entry = self._load(path, mimetypes.guess_type(path))
+        if not entry.exists:
+            # Not cached, so requests for missing paths can't evict the files
+            # that exist.
+            self.cache.pop(path, None)
+            return entry
+        gzip = self._load(path + '.gz', entry.guessed_type)
+        entry.gzip_stat_key = gzip.stat_key
+        if gzip.exists:
+            entry.gzip = gzip
+        self.cache[path] = entry
+        return entry
+
+    def _load(self, path, guessed_type):
+        """
+        Stat, and read if small enough, the file at path, whose
+        mimetypes.guess_type is guessed_type.
+        """
+        entry = _Entry(path, guessed_type)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return entry
+        if not stat.S_ISREG(st.st_mode):
+            return entry
+        entry.exists = True
+        entry.stat_key = _stat_key(path, st)
+        entry.etag = '%x-%x-%x' % (st.st_ino, st.st_size, int(st.st_mtime))
+        entry.last_modified = datetime.utcfromtimestamp(int(st.st_mtime))
+        content_type, encoding = guessed_type
+        if content_type is None or encoding is not None:
+            content_type = 'application/octet-stream'
+        entry.headers = [
+            ('Content-Type', content_type),
+            ('Last-Modified', formatdate(st.st_mtime, usegmt=True)),
+            ('ETag', '"%s"' % entry.etag),
+            ('Accept-Ranges', 'bytes'),
+            ]
+        if st.st_size <= self.max_cached_file_size:
+            try:
+                f = open(path, 'rb')
+                try:
+                    body = f.read()
+                finally:
+                    f.close()
+            except IOError:
+                entry.exists = False
+                return entry
+            # Only trust the content if it didn't change while being read.
+            if len(body) == st.st_size:
+                entry.body = body
+        return entry
+
+
+class _Entry(object):
+    """
+    Cached stat results, headers and, for small files, the content of a file.
+    """
+
+    exists = False
+    stat_key = None
+    etag = None
+    last_modified = None
+    headers = None
+    body = None
+    # The _Entry of the file's sidecar, if it has one, and the sidecar's
+    # stat_key.
+    gzip = None
+    gzip_stat_key = None
+
+    def __init__(self, path, guessed_type):
+        self.path = path
+        self.guessed_type = guessed_type
+        self.checked = time.time()
+
+
+def _cached_bytes(entry):
+    """
+    Return the size of the content cached by the entry and its sidecar.
+    """
+    size = len(entry.body or '')
+    if entry.gzip is not None:
+        size += len(entry.gzip.body or '')
+    return size
+
+
+def _stat_key(path, st=None):
+    """
+    Return the (inode, size, mtime) of the regular file at path, used to spot
+    changes, or None if there is no such file.
+    """
+    if st is None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime)
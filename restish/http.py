@@ -2,11 +2,43 @@
 HTTP Request and Response objects, simple Response factories and exceptions
 types for common HTTP errors.
 """
+from email.utils import formatdate
+import mimetypes
+import os
+import random
+
 import webob
+from webob.datastruct import EnvironHeaders
 
 from restish import error, url
 
 
+# WSGI environ keys that URL-valued Request properties depend on.
+_URL_ENVIRON_KEYS = ('wsgi.url_scheme', 'HTTP_HOST', 'SERVER_NAME',
+                     'SERVER_PORT', 'SCRIPT_NAME', 'PATH_INFO', 'QUERY_STRING')
+
+# Maximum number of byte ranges in a Range header. A request for more, e.g.
+# many small or overlapping ranges to amplify the response, is sent the whole
+# body instead, as RFC 7233 section 6.1 allows.
+MAX_RANGES = 16
+
+
+def _cached_url(func):
+    """
+    Decorator to make a URL-valued Request property that is computed once and
+    cached in the request's environ.
+    """
+    name = func.__name__
+    def getter(self):
+        cache = self._url_cache()
+        try:
+            return cache[name]
+        except KeyError:
+            value = cache[name] = func(self)
+            return value
+    return property(getter, doc=func.__doc__)
+
+
 class Request(webob.Request):
     """
     HTTP request class.
@@ -17,47 +49,64 @@ class Request(webob.Request):
     Request is basically a webob.Request with one important difference:
     url-like properties are represented as url.URL instances to allow them
     to manipulated easily and safely.
+
+    The url-like properties are computed once and cached in the environ,
+    shared by all Request instances for the environ. The cache is discarded
+    if any of the environ keys they depend on is changed, e.g. by middleware
+    that moves segments from PATH_INFO to SCRIPT_NAME.
     """
 
     def __init__(self, environ):
         webob.Request.__init__(self, environ)
 
-    @property
+    def _url_cache(self):
+        """
+        Return the dict of cached url-like properties, discarding any cached
+        for different environ values.
+        """
+        environ = self.environ
+        key = tuple(map(environ.get, _URL_ENVIRON_KEYS))
+        cached = environ.get('restish.url_cache')
+        if cached is None or cached[0] != key:
+            cached = environ['restish.url_cache'] = (key, {})
+        return cached[1]
+
+    @_cached_url
     def host_url(self):
         """
         Return the host's URL, i.e. the URL of the HTTP server.
         """
         return url.URL(super(Request, self).host_url)
 
-    @property
+    @_cached_url
     def application_url(self):
         """
         Return the WSGI application's URL.
         """
         return url.URL(super(Request, self).application_url)
 
-    @property
+    @_cached_url
     def application_path(self):
         """
         Return the path part of the WSGI application's URL.
         """
         return self.application_url.path
 
-    @property
+    @_cached_url
     def path_url(self):
         """
         Return the path's URL, i.e. the current URL without the query string.
         """
         return url.URL(super(Request, self).path_url)
 
-    @property
+    @_cached_url
     def url(self):
         """
         Return the full current (i.e. requested), URL.
         """
         return url.URL(super(Request, self).url)
 
-    @property
+    @_cached_url
     def path(self):
         """
         Return the path part of the current URL, relative to the root of the
@@ -65,7 +114,7 @@ class Request(webob.Request):
         """
         return url.URL(super(Request, self).path)
 
-    @property
+    @_cached_url
     def path_qs(self):
         """
         Return the path of the current URL, relative to the root of the web
@@ -74,6 +123,59 @@ class Request(webob.Request):
         return url.URL(super(Request, self).path_qs)
 
 
+class LazyRequest(object):
+    """
+    Lightweight request that builds the full Request only when needed.
+
+    The WSGI environ, the request method, the path info and the headers are
+    read straight from the environ. Any other attribute is looked up on the
+    full Request, which is created on first use and available as the request
+    attribute.
+
+    A LazyRequest is cheaper to create than a Request and avoids building the
+    Request at all for requests that never use its richer attributes, e.g. a
+    request that is not found while traversing the resource hierarchy.
+    """
+
+    __slots__ = ('environ', '_request')
+
+    def __init__(self, environ):
+        # Bypass __setattr__, it's only needed for ad hoc attributes.
+        object.__setattr__(self, 'environ', environ)
+        object.__setattr__(self, '_request', None)
+
+    @property
+    def method(self):
+        return self.environ['REQUEST_METHOD']
+
+    @property
+    def path_info(self):
+        return self.environ.get('PATH_INFO', '')
+
+    @property
+    def headers(self):
+        return EnvironHeaders(self.environ)
+
+    @property
+    def request(self):
+        """
+        Return the full Request, creating it on first use.
+        """
+        request = self._request
+        if request is None:
+            request = self._request = Request(self.environ)
+        return request
+
+    def __getattr__(self, name):
+        return getattr(self.request, name)
+
+    def __setattr__(self, name, value):
+        if name in LazyRequest.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.request, name, value)
+
+
 class Response(webob.Response):
     """
     HTTP response class.
@@ -123,6 +225,76 @@ def ok(headers, body):
     return Response("200 OK", headers, body)
 
 
+def file_response(path_or_file, headers=None, block_size=None):
+    """
+    200 OK, sending a file.
+
+    The file is opened (if given a path) and sent from its current position
+    by a FileIter. RestishApp hands the file to the WSGI server's
+    wsgi.file_wrapper, when there is one, to let the server send it
+    efficiently, e.g. using sendfile.
+
+    Content-Length, Last-Modified and ETag headers are filled in from the
+    file's stat data, and Content-Type from the path's extension, unless
+    already in headers. Byte ranges of the file can be requested, see
+    range_response.
+    """
+    if isinstance(path_or_file, basestring):
+        f = open(path_or_file, 'rb')
+        path = path_or_file
+    else:
+        f = path_or_file
+        path = getattr(f, 'name', None)
+    if headers is None:
+        headers = []
+    else:
+        headers = list(headers)
+    names = set(name.lower() for (name, value) in headers)
+    stat = os.fstat(f.fileno())
+    generated = [
+        ('Content-Length', str(stat.st_size - f.tell())),
+        ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+        ('ETag', '"%x-%x-%x"' % (stat.st_ino, stat.st_size,
+                                 int(stat.st_mtime))),
+        ('Accept-Ranges', 'bytes'),
+        ]
+    if isinstance(path, basestring):
+        content_type = mimetypes.guess_type(path)[0]
+        if content_type is not None:
+            generated.append(('Content-Type', content_type))
+    headers.extend(header for header in generated
+                   if header[0].lower() not in names)
+    return Response("200 OK", headers, FileIter(f, block_size))
+
+
+class FileIter(object):
+    """
+    Iterator over the content of a file, read in blocks of block_size bytes,
+    that closes the file when closed.
+
+    A large default block size keeps the number of reads, and the Python work
+    per byte sent, down when the server has no wsgi.file_wrapper.
+    """
+
+    block_size = 256 * 1024
+
+    def __init__(self, file, block_size=None):
+        self.file = file
+        if block_size is not None:
+            self.block_size = block_size
+
+    def __iter__(self):
+        read, block_size = self.file.read, self.block_size
+        while True:
+            data = read(block_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        self.file.close()
+
+
 def created(location, body, headers=None):
     """
     201 Created
@@ -150,6 +322,218 @@ def created(location, body, headers=None):
     return Response("201 Created", headers, body)
 
 
+def partial_content(headers, body):
+    """
+    206 Partial Content
+
+    The server has fulfilled the partial GET request for the resource. The
+    request MUST have included a Range header field indicating the desired
+    range, and MAY have included an If-Range header field to make the request
+    conditional.
+
+    The response MUST include a Content-Range header field indicating the
+    range included with this response, or a multipart/byteranges Content-Type
+    including Content-Range fields for each part. If a Content-Length header
+    field is present in the response, its value MUST match the actual number of
+    OCTETs transmitted in the message-body.
+    """
+    return Response("206 Partial Content", headers, body)
+
+
+def range_response(environ, response):
+    """
+    Return a response with the byte ranges of the 200 OK response's body
+    requested by the environ's Range header, or the response itself if there
+    is no Range header, it is not valid, it has more than MAX_RANGES ranges or
+    the If-Range header does not match.
+
+    Only a body that can be read from any position is sent in ranges, i.e. a
+    FileIter, a seekable file-like object or a str, and only the requested
+    bytes are read. A single range is sent as a 206 Partial Content, multiple
+    ranges are sent as a multipart/byteranges 206 Partial Content and a 416
+    Requested Range Not Satisfiable is sent if no range is satisfiable.
+
+    RestishApp calls this for GET requests.
+    """
+    header = environ.get('HTTP_RANGE')
+    if not header or not response.status.startswith('200'):
+        return response
+    body = _ranged_body(response.app_iter)
+    if body is None:
+        return response
+    read_range, length = body
+    ranges = _byte_ranges(header, length)
+    if ranges is None or not _if_range(environ, response):
+        return response
+    if not ranges:
+        _close(response.app_iter)
+        return requested_range_not_satisfiable(length)
+    headers = [(name, value) for (name, value) in response.headerlist
+               if name.lower() not in ('content-length', 'content-range')]
+    if len(ranges) == 1:
+        [(start, stop)] = ranges
+        headers.append(('Content-Range', _content_range(start, stop, length)))
+        headers.append(('Content-Length', str(stop - start)))
+        parts, trailer = [('', start, stop)], ''
+    else:
+        content_type = response.headers.get('Content-Type')
+        headers = [(name, value) for (name, value) in headers
+                   if name.lower() != 'content-type']
+        boundary = '%032x' % random.getrandbits(128)
+        parts = []
+        for start, stop in ranges:
+            prefix = ['\r\n--%s\r\n' % boundary]
+            if content_type is not None:
+                prefix.append('Content-Type: %s\r\n' % content_type)
+            prefix.append('Content-Range: %s\r\n\r\n' %
+                          _content_range(start, stop, length))
+            parts.append((''.join(prefix), start, stop))
+        trailer = '\r\n--%s--\r\n' % boundary
+        content_length = len(trailer) + sum(len(prefix) + stop - start
+                                            for (prefix, start, stop) in parts)
+        headers.append(('Content-Type',
+                        'multipart/byteranges; boundary=%s' % boundary))
+        headers.append(('Content-Length', str(content_length)))
+    return partial_content(headers, _RangeIter(response.app_iter, read_range,
+                                               parts, trailer))
+
+
+def _ranged_body(app_iter):
+    """
+    Return a (read_range, length) tuple for a body that can be read in byte
+    ranges, where read_range(start, stop) iterates the bytes from start to
+    stop, or None.
+    """
+    if isinstance(app_iter, list) and len(app_iter) == 1 and \
+            isinstance(app_iter[0], str):
+        body = app_iter[0]
+        return (lambda start, stop: [body[start:stop]]), len(body)
+    if isinstance(app_iter, FileIter):
+        f, block_size = app_iter.file, app_iter.block_size
+    elif hasattr(app_iter, 'read') and hasattr(app_iter, 'seek') and \
+            hasattr(app_iter, 'tell'):
+        f, block_size = app_iter, FileIter.block_size
+    else:
+        return None
+    # The body is sent from the file's current position.
+    offset = f.tell()
+    f.seek(0, 2)
+    length = f.tell() - offset
+    f.seek(offset)
+    def read_range(start, stop):
+        f.seek(offset + start)
+        remaining = stop - start
+        while remaining > 0:
+            data = f.read(min(block_size, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            yield data
+    return read_range, length
+
+
+def _byte_ranges(header, length):
+    """
+    Parse a Range header into a sorted list of (start, stop) byte ranges, stop
+    exclusive, for a body of length bytes, merging overlapping and adjacent
+    ranges. Return None if the header is not valid or has more than
+    MAX_RANGES ranges, and an empty list if no range is satisfiable.
+    """
+    units, sep, specs = header.partition('=')
+    if not sep or units.strip().lower() != 'bytes':
+        return None
+    # Counted before parsing, and merging, so that a long header is not parsed.
+    if specs.count(',') >= MAX_RANGES:
+        return None
+    ranges = []
+    valid = False
+    for spec in specs.split(','):
+        spec = spec.strip()
+        if not spec:
+            continue
+        first, sep, last = spec.partition('-')
+        first, last = first.strip(), last.strip()
+        if not sep or (first and not first.isdigit()) or \
+                (last and not last.isdigit()) or not (first or last):
+            return None
+        if first:
+            start = int(first)
+            if last:
+                stop = int(last) + 1
+                if stop <= start:
+                    return None
+            else:
+                stop = length
+        else:
+            # A suffix range, i.e. the last bytes.
+            start, stop = max(length - int(last), 0), length
+        valid = True
+        stop = min(stop, length)
+        if start < stop:
+            ranges.append((start, stop))
+    if not valid:
+        return None
+    ranges.sort()
+    merged = ranges[:1]
+    for start, stop in ranges[1:]:
+        if start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(stop, merged[-1][1]))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _if_range(environ, response):
+    """
+    Test if the environ's If-Range header, if any, matches the response's
+    entity tag or last modified date.
+    """
+    if_range = environ.get('HTTP_IF_RANGE', '').strip()
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Only strong entity tags match.
+        etag = response.headers.get('ETag')
+        return etag is not None and not etag.startswith('W/') and \
+                etag == if_range
+    return response.headers.get('Last-Modified') == if_range
+
+
+def _content_range(start, stop, length):
+    return 'bytes %d-%d/%d' % (start, stop - 1, length)
+
+
+def _close(app_iter):
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+
+
+class _RangeIter(object):
+    """
+    Iterator over the byte ranges of a body, each preceded by a prefix,
+    followed by the trailer, that closes the original app_iter when closed.
+    """
+
+    def __init__(self, app_iter, read_range, parts, trailer):
+        self.app_iter = app_iter
+        self.read_range = read_range
+        self.parts = parts
+        self.trailer = trailer
+
+    def __iter__(self):
+        for prefix, start, stop in self.parts:
+            if prefix:
+                yield prefix
+            for data in self.read_range(start, stop):
+                yield data
+        if self.trailer:
+            yield self.trailer
+
+    def close(self):
+        _close(self.app_iter)
+
+
 # Redirection 3xx
 
 def moved_permanently(location):
@@ -444,6 +828,34 @@ class ConflictError(error.HTTPClientError):
     response_factory = staticmethod(conflict)
 
 
+def requested_range_not_satisfiable(length, headers=None, body=None):
+    """
+    416 Requested Range Not Satisfiable
+
+    A server SHOULD return a response with this status code if a request
+    included a Range request-header field, and none of the range-specifier
+    values in this field overlap the current extent of the selected resource,
+    and the request did not include an If-Range request-header field.
+
+    When this status code is returned for a byte-range request, the response
+    SHOULD include a Content-Range entity-header field specifying the current
+    length of the selected resource. length is the current length, or None
+    to leave out the Content-Range header.
+    """
+    if headers is None and body is None:
+        headers = [('Content-Type', 'text/plain')]
+        body = '416 Requested Range Not Satisfiable'
+    headers = list(headers or [])
+    if length is not None:
+        headers.append(('Content-Range', 'bytes */%d' % length))
+    return Response("416 Requested Range Not Satisfiable", headers, body)
+
+
+class RequestedRangeNotSatisfiableError(error.HTTPClientError):
+    """ Exception for the 416 http code """
+    response_factory = staticmethod(requested_range_not_satisfiable)
+
+
 # Server Error 5xx
 
 def internal_server_error(headers=None, body=None):
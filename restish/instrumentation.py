@@ -0,0 +1,186 @@
+"""
+Per-request timing instrumentation.
+
+An instrumentation sink, installed with RestishApp's instrumentation argument,
+is called back at the start and stop of each phase of a request:
+
+    locate_resource
+        Traversing the resource hierarchy to find the resource.
+    resource_child
+        Each resource_child call made while traversing.
+    get_response
+        Calling the resource (and any resources it returns) for a response.
+    dispatch
+        Calling the request handler chosen by a Resource's content negotiation.
+    app_iter
+        Sending the response body, until the WSGI server closes the app_iter.
+        Not timed for an http.file_response handed to the server's
+        wsgi.file_wrapper.
+
+Each callback is passed the phase name and an info dict with the request, the
+class of the resource (None if not known) and the route pattern, built from
+the @child patterns matched so far, e.g. '/users/{id}'. Segments consumed by a
+child lookup without a known pattern are shown as '*'.
+
+Nothing is called when there is no sink.
+"""
+import threading
+import time
+
+
+class Sink(object):
+    """
+    Base class for instrumentation sinks, ignoring all callbacks.
+    """
+
+    def start(self, phase, info):
+        """
+        Called at the start of a phase, returning a token for stop().
+        """
+        return None
+
+    def stop(self, phase, info, token):
+        """
+        Called at the end of a phase with the token returned from start().
+        """
+
+
+class Aggregator(Sink):
+    """
+    Instrumentation sink that collects the count, total and max latency, in
+    seconds, of each phase by route pattern.
+    """
+
+    timer = staticmethod(time.time)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def start(self, phase, info):
+        return self.timer()
+
+    def stop(self, phase, info, token):
+        elapsed = self.timer() - token
+        key = (info['route'], phase)
+        self._lock.acquire()
+        try:
+            stats = self.stats.get(key)
+            if stats is None:
+                self.stats[key] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed > stats[2]:
+                    stats[2] = elapsed
+        finally:
+            self._lock.release()
+
+    def report(self):
+        """
+        Return a list of (route, phase, count, total, max) tuples, in order of
+        decreasing total latency.
+        """
+        self._lock.acquire()
+        try:
+            report = [key + tuple(stats) for (key, stats) \
+                      in self.stats.iteritems()]
+        finally:
+            self._lock.release()
+        report.sort(key=lambda item: item[3], reverse=True)
+        return report
+
+    def clear(self):
+        """
+        Discard the collected stats.
+        """
+        self._lock.acquire()
+        try:
+            self.stats = {}
+        finally:
+            self._lock.release()
+
+
+class Trace(object):
+    """
+    Instrumentation of a single request, passing the start and stop of each
+    phase to the sink.
+
+    RestishApp stores the trace in the request's environ, as
+    'restish.instrumentation', for the phases inside a resource.
+    """
+
+    def __init__(self, sink, request):
+        self.sink = sink
+        self.request = request
+        self.route = []
+        # Pattern matched by the current resource_child call, if known.
+        self.pattern = None
+
+    def info(self, resource):
+        """
+        Return the info dict passed to the sink for the resource.
+        """
+        if resource is None:
+            cls = None
+        else:
+            cls = type(resource)
+        return {'request': self.request, 'resource': cls,
+                'route': '/' + '/'.join(self.route)}
+
+    def call(self, phase, resource, callable, *a, **k):
+        """
+        Call callable(*a, **k) as the phase for the resource.
+        """
+        info = self.info(resource)
+        token = self.sink.start(phase, info)
+        try:
+            return callable(*a, **k)
+        finally:
+            info['route'] = '/' + '/'.join(self.route)
+            self.sink.stop(phase, info, token)
+
+    def resource_child(self, resource, resource_child, request, segments):
+        """
+        Call resource_child, the resource's bound resource_child method, adding
+        the matched pattern to the route.
+        """
+        info = self.info(resource)
+        token = self.sink.start('resource_child', info)
+        self.pattern = None
+        try:
+            return resource_child(request, segments)
+        finally:
+            self.route.append(self.pattern or '*')
+            info['route'] = '/' + '/'.join(self.route)
+            self.sink.stop('resource_child', info, token)
+
+    def app_iter(self, resource, app_iter):
+        """
+        Wrap the response's app_iter to time sending the body.
+        """
+        info = self.info(resource)
+        return _TracedAppIter(self.sink, info, app_iter)
+
+
+class _TracedAppIter(object):
+    """
+    app_iter wrapper that stops the app_iter phase when closed.
+    """
+
+    def __init__(self, sink, info, app_iter):
+        self.sink = sink
+        self.info = info
+        self.app_iter = app_iter
+        self.token = sink.start('app_iter', info)
+
+    def __iter__(self):
+        return iter(self.app_iter)
+
+    def close(self):
+        try:
+            close = getattr(self.app_iter, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self.sink.stop('app_iter', self.info, self.token)
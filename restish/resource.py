@@ -1,16 +1,23 @@
 """
 Base Resource class and associates methods for children and content negotiation
 """
+import calendar
+from email.utils import mktime_tz, parsedate_tz
 import inspect
 import mimetypes
 import re
 
-from restish import http, _mimeparse as mimeparse
+from webob.etag import ETagMatcher
+
+from restish import http, url, util, _mimeparse as mimeparse
 
 
 _RESTISH_CHILD = "restish_child"
 _RESTISH_METHOD = "restish_method"
 _RESTISH_MATCH = "restish_match"
+_RESTISH_CACHEABLE = "restish_cacheable"
+_RESTISH_VALIDATORS = "restish_validators"
+_RESTISH_ROUTE = "restish_route"
 
 
 SHORT_CONTENT_TYPE_EXTRA = {
@@ -26,6 +33,7 @@ class _metaResource(type):
         cls = type.__new__(cls, name, bases, clsattrs)
         _gather_request_dispatchers(cls, clsattrs)
         _gather_child_factories(cls, clsattrs)
+        _gather_routes(cls, clsattrs)
         return cls
 
 
@@ -34,12 +42,19 @@ def _gather_request_dispatchers(cls, clsattrs):
     Gather any request handler -annotated methods and add them to the class's
     request_dispatchers attribute.
     """
-    # Copy the super class's 'request_dispatchers' dict (if any) to this class.
-    cls.request_dispatchers = dict(getattr(cls, 'request_dispatchers', {}))
+    # Copy the super class's 'request_dispatchers' dict (if any) to this class,
+    # copying the lists too so this class's dispatchers are not added to the
+    # super class's lists.
+    cls.request_dispatchers = dict((method, list(dispatchers)) \
+            for (method, dispatchers) \
+            in getattr(cls, 'request_dispatchers', {}).iteritems())
     for callable in _find_annotated_funcs(clsattrs, _RESTISH_METHOD):
         method = getattr(callable, _RESTISH_METHOD, None)
         match = getattr(callable, _RESTISH_MATCH)
         cls.request_dispatchers.setdefault(method, []).append((callable, match))
+    # Index each method's dispatchers by accepted media type.
+    cls.negotiation_index = dict((method, _NegotiationIndex(dispatchers)) \
+            for (method, dispatchers) in cls.request_dispatchers.iteritems())
 
 
 def _gather_child_factories(cls, clsattrs):
@@ -56,6 +71,28 @@ def _gather_child_factories(cls, clsattrs):
     # Sort the child factories by score.
     cls.child_factories = sorted(cls.child_factories, \
                                  key=lambda i: i[0].score, reverse=True)
+    # Compile the child factories into the class's router.
+    cls.compiled_child_router = cls.child_router(cls.child_factories)
+
+
+def _gather_routes(cls, clsattrs):
+    """
+    Register the patterns of any named 'child' annotated methods as routes.
+    """
+    for func in _find_annotated_funcs(clsattrs, _RESTISH_ROUTE):
+        name, parent = getattr(func, _RESTISH_ROUTE)
+        matcher = getattr(func, _RESTISH_CHILD)
+        if not isinstance(matcher, TemplateChildMatcher):
+            raise TypeError("Route %r of %s.%s is not a template pattern" % \
+                            (name, cls.__name__, func.__name__))
+        routes.register(name, matcher.pattern, parent)
+
+
+def _is_dynamic_segment(segment):
+    """
+    Test if a pattern segment is a {dynamic} segment.
+    """
+    return len(segment) >= 2 and segment[0] == '{' and segment[-1] == '}'
 
 
 def _find_annotated_funcs(clsattrs, annotation):
@@ -69,6 +106,204 @@ def _find_annotated_funcs(clsattrs, annotation):
     return funcs
 
 
+class LinearChildRouter(object):
+    """
+    Child router that tries each child factory's matcher in turn, returning
+    the first match.
+    """
+
+    def __init__(self, child_factories):
+        self.child_factories = child_factories
+
+    def __call__(self, request, segments):
+        for matcher, func in self.child_factories:
+            match = matcher(request, segments)
+            if match is not None:
+                return func, match
+        return None
+
+
+class _TemplateChildRouter(object):
+    """
+    Base class for child routers that compile the TemplateChildMatcher
+    patterns.
+
+    Subclasses implement _compile(templates) and _find(segments), where
+    templates is a list of (index, matcher, func) tuples in score order and
+    _find returns an (index, func, match) tuple for the best template match or
+    None.
+
+    Any other type of matcher is tried in turn, just like LinearChildRouter,
+    if it is ordered before the best template match.
+    """
+
+    def __init__(self, child_factories):
+        templates = []
+        self.others = []
+        for index, (matcher, func) in enumerate(child_factories):
+            if isinstance(matcher, TemplateChildMatcher):
+                templates.append((index, matcher, func))
+            else:
+                self.others.append((index, matcher, func))
+        self._compile(templates)
+
+    def __call__(self, request, segments):
+        found = self._find(segments)
+        for index, matcher, func in self.others:
+            if found is not None and index > found[0]:
+                break
+            match = matcher(request, segments)
+            if match is not None:
+                return func, match
+        if found is None:
+            return None
+        return found[1:]
+
+
+class TrieChildRouter(_TemplateChildRouter):
+    """
+    Child router that compiles the TemplateChildMatcher patterns into a trie
+    of segments.
+
+    Static segments are resolved by dict lookup and dynamic segments are only
+    tried when no static segment leads to a match. The search visits static
+    segments before dynamic segments and longer patterns before shorter
+    patterns, which is exactly the order of the matchers' scores, so the match
+    found is the one the LinearChildRouter would have found.
+
+    Unlike the TemplateChildMatcher, which matches a regex against the joined
+    segments, patterns are matched a whole segment at a time.
+    """
+
+    def _compile(self, templates):
+        self.trie = _TrieNode()
+        for template in templates:
+            self.trie.add(template[1].pattern.split('/'), template)
+
+    def _find(self, segments):
+        found = self.trie.find(segments, 0, [])
+        if found is None:
+            return None
+        (index, matcher, func), depth, values = found
+        kwargs = dict(zip(matcher.names, values))
+        return index, func, ([], kwargs, segments[depth:])
+
+
+class RegexChildRouter(_TemplateChildRouter):
+    """
+    Child router that compiles the TemplateChildMatcher patterns into one
+    regex per pattern segment count.
+
+    Each regex is an alternation of the patterns' regexes, in score order, so
+    a single match finds the best pattern for that number of segments. The
+    patterns are matched exactly as a TemplateChildMatcher would match them.
+    """
+
+    # Python's re module has a limit on the number of groups so a large number
+    # of patterns is split across a number of regexes.
+    max_groups = 99
+
+    def _compile(self, templates):
+        by_count = {}
+        for index, matcher, func in templates:
+            by_count.setdefault(matcher._count, []).append((index, matcher, func))
+        self.regexes = []
+        for count, templates in sorted(by_count.items()):
+            chunks = [[]]
+            num_groups = 0
+            for template in templates:
+                matcher = template[1]
+                if num_groups + len(matcher.names) + 1 > self.max_groups:
+                    chunks.append([])
+                    num_groups = 0
+                chunks[-1].append(template)
+                num_groups += len(matcher.names) + 1
+            self.regexes.append((count, [_compile_alternation(chunk) \
+                                         for chunk in chunks]))
+
+    def _find(self, segments):
+        best = None
+        for count, regexes in self.regexes:
+            # Note: no need to use the url module to join the path segments
+            # here because we want the unquoted and decoded segments.
+            match_path = '/'.join(segments[:count])
+            for regex, groups in regexes:
+                match = regex.match(match_path)
+                if match is not None:
+                    break
+            else:
+                continue
+            index, func, names = groups[match.lastgroup]
+            if best is not None and best[0] < index:
+                continue
+            kwargs = dict((name, match.group(group)) for (name, group) in names)
+            best = index, func, ([], kwargs, segments[count:])
+        return best
+
+
+def _compile_alternation(templates):
+    """
+    Compile a regex that matches any one of the templates' patterns, returning
+    the regex and a mapping of the alternatives' group names to (index, func,
+    names) tuples.
+    """
+    alternatives = []
+    groups = {}
+    for index, matcher, func in templates:
+        group = 'c%d' % (index,)
+        prefix = group + '_'
+        alternatives.append('(?P<%s>%s)$' % (group, matcher._expression(prefix)))
+        groups[group] = (index, func, [(name, prefix+name) \
+                                       for name in matcher.names])
+    return re.compile('^(?:' + '|'.join(alternatives) + ')'), groups
+
+
+class _TrieNode(object):
+    """
+    A node in a TrieChildRouter's trie.
+    """
+
+    def __init__(self):
+        self.static = {}
+        self.dynamic = None
+        self.terminals = []
+
+    def add(self, segments, terminal):
+        """
+        Add the terminal to the trie at the end of the path of pattern
+        segments.
+        """
+        node = self
+        for segment in segments:
+            if _is_dynamic_segment(segment):
+                if node.dynamic is None:
+                    node.dynamic = _TrieNode()
+                node = node.dynamic
+            else:
+                node = node.static.setdefault(segment, _TrieNode())
+        node.terminals.append(terminal)
+
+    def find(self, segments, depth, values):
+        """
+        Find the best terminal matching the segments, returning a (terminal,
+        depth, dynamic values) tuple or None.
+        """
+        if depth < len(segments):
+            segment = segments[depth]
+            node = self.static.get(segment)
+            if node is not None:
+                found = node.find(segments, depth+1, values)
+                if found is not None:
+                    return found
+            if self.dynamic is not None:
+                found = self.dynamic.find(segments, depth+1, values+[segment])
+                if found is not None:
+                    return found
+        if self.terminals:
+            return self.terminals[0], depth, values
+        return None
+
+
 class Resource(object):
     """
     Base class for additional resource types.
@@ -80,63 +315,267 @@ class Resource(object):
 
     __metaclass__ = _metaResource
 
+    # Router class used to find the child factory matching the segments, see
+    # LinearChildRouter, TrieChildRouter and RegexChildRouter.
+    child_router = LinearChildRouter
+
     def resource_child(self, request, segments):
-        for matcher, func in self.child_factories:
-            match = matcher(request, segments)
-            if match is not None:
-                break
-        else:
+        match = self.compiled_child_router(request, segments)
+        if match is None:
             return None
-        match_args, match_kwargs, segments = match
+        func, (match_args, match_kwargs, segments) = match
+        # Tell the instrumentation, if any, which pattern matched.
+        trace = request.environ.get('restish.instrumentation')
+        if trace is not None:
+            trace.pattern = getattr(getattr(func, _RESTISH_CHILD), 'pattern',
+                                    None)
         result = func(self, request, segments, *match_args, **match_kwargs)
         if result is None:
             return None
-        elif isinstance(result, tuple):
-            return result
-        else:
-            return result, segments
+        elif not isinstance(result, tuple):
+            result = result, segments
+        if getattr(func, _RESTISH_CACHEABLE, False):
+            result = CacheableChild(result)
+        return result
 
     def __call__(self, request):
-        # Get the dispatchers for the request method.
-        dispatchers = self.request_dispatchers.get(request.method)
+        # Get the dispatchers for the request method. A HEAD request is
+        # dispatched to the GET handler unless there is an explicit HEAD
+        # handler; the handler can check request.method to avoid generating a
+        # body that will never be sent.
+        method = request.method
+        dispatchers = self.request_dispatchers.get(method)
+        if dispatchers is None and method == 'HEAD':
+            method = 'GET'
+            dispatchers = self.request_dispatchers.get(method)
         # No dispatchers for method, send 405 with list of allowed methods.
         if dispatchers is None:
-            return http.method_not_allowed(', '.join(self.request_dispatchers))
-        # Look up the best dispatcher
-        dispatcher = _best_dispatcher(dispatchers, request)
+            return http.method_not_allowed(', '.join(_allowed_methods(self)))
+        # Look up the best dispatcher and the content type of its response.
+        dispatcher, content_type = _negotiate(self.__class__, method,
+                                              dispatchers, request)
         if dispatcher is not None:
             (callable, match) = dispatcher
-            response = callable(self, request)
+            # Send 304 if the client's copy is current, avoiding the handler
+            # completely.
+            validators = getattr(callable, _RESTISH_VALIDATORS, None)
+            if validators is not None:
+                etag, last_modified = _validate(self, request, validators)
+                if _not_modified(request, etag, last_modified):
+                    return _set_validators(http.not_modified(), etag,
+                                           last_modified)
+            trace = request.environ.get('restish.instrumentation')
+            if trace is None:
+                response = callable(self, request)
+            else:
+                response = trace.call('dispatch', self, callable, self,
+                                      request)
             # Try to autocomplete the content-type header if not set
             # explicitly.
-            # If there's no accept from the client and there's only one
-            # possible type from the match then use that as the best match.
-            # Otherwise use mimeparse to work out what the best match was. If
-            # the best match if not a wildcard then we know what content-type
-            # should be.
-            if isinstance(response, http.Response) and \
+            if content_type is not None and \
+                    isinstance(response, http.Response) and \
                     not response.headers.get('content-type'):
-                accept = str(request.accept)
-                if not accept and len(match['accept']) == 1:
-                    best_match = match['accept'][0]
-                else:
-                    best_match = mimeparse.best_match(match['accept'], accept)
-                if '*' not in best_match:
-                    response.headers['content-type'] = best_match
+                response.headers['content-type'] = content_type
+            if validators is not None and isinstance(response, http.Response):
+                _set_validators(response, etag, last_modified)
             return response
         # No match, send 406
         return http.not_acceptable([('Content-Type', 'text/plain')], \
                                    '406 Not Acceptable')
 
 
-def _best_dispatcher(dispatchers, request):
+# Cache of content negotiation results, see _negotiate. Content negotiation
+# depends only on the resource class, the request method and the request's
+# Content-Type and Accept headers so the result can be shared by all requests.
+negotiation_cache = util.LRUCache(1000)
+
+
+def _allowed_methods(resource):
+    """
+    Return the list of methods the resource allows.
+    """
+    methods = list(resource.request_dispatchers)
+    if 'GET' in methods and 'HEAD' not in methods:
+        methods.append('HEAD')
+    return methods
+
+
+def _negotiate(cls, method, dispatchers, request):
+    """
+    Find the best dispatcher for the request and the content type of its
+    response, returning a (dispatcher, content_type) tuple.
+
+    The dispatcher is None if there is no acceptable dispatcher and the
+    content type is None if it cannot be known before calling the dispatcher.
+    """
+    environ = request.environ
+    content_type = environ.get('CONTENT_TYPE')
+    accept = environ.get('HTTP_ACCEPT')
+    index = cls.negotiation_index[method]
+    # A simple Accept header can be resolved using the class's index.
+    if accept and not content_type:
+        result = index.lookup(accept)
+        if result is not None:
+            return result
+    # Negotiate, and cache, on the request's media type alone when no
+    # dispatcher's content type has parameters to match, so that parameters
+    # such as a multipart/form-data boundary don't make every request a miss.
+    if content_type and ';' in content_type and \
+            not index.content_type_params:
+        content_type = content_type.split(';', 1)[0].strip()
+    key = (cls, method, content_type, accept)
+    result = negotiation_cache.get(key)
+    if result is None:
+        dispatcher = _best_dispatcher(dispatchers, request, content_type)
+        if dispatcher is None:
+            result = None, None
+        else:
+            result = dispatcher, _content_type(dispatcher, request)
+        negotiation_cache[key] = result
+    return result
+
+
+def _validate(resource, request, validators):
+    """
+    Call the dispatcher's validators, returning an (etag, last_modified)
+    tuple. Missing validators give None.
+    """
+    etag, last_modified = validators
+    if etag is not None:
+        etag = etag(resource, request)
+    if last_modified is not None:
+        last_modified = last_modified(resource, request)
+    return etag, last_modified
+
+
+def _not_modified(request, etag, last_modified):
+    """
+    Test if the request's conditional headers match the current validators.
+
+    If-None-Match takes precedence over If-Modified-Since, which is ignored
+    when both are sent. Entity tags use the weak comparison allowed for GET.
+    """
+    # Note: the headers are parsed straight from the environ to avoid
+    # creating the full Request from an http.LazyRequest.
+    environ = request.environ
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag is not None and \
+                ETagMatcher.parse(if_none_match).weak_match(etag)
+    if last_modified is not None:
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            if_modified_since = parsedate_tz(if_modified_since)
+            if if_modified_since is not None:
+                # HTTP dates have a resolution of one second.
+                return _timestamp(last_modified) <= \
+                        mktime_tz(if_modified_since)
+    return False
+
+
+def _timestamp(dt):
+    """
+    Convert a datetime to a UTC timestamp, treating a naive datetime as UTC.
+    """
+    return calendar.timegm(dt.utctimetuple())
+
+
+def _set_validators(response, etag, last_modified):
+    """
+    Add ETag and Last-Modified headers to the response, unless already set.
+    """
+    if etag is not None and 'ETag' not in response.headers:
+        response.etag = etag
+    if last_modified is not None and 'Last-Modified' not in response.headers:
+        response.last_modified = last_modified
+    return response
+
+
+# An Accept header that is a single media type without parameters.
+_SIMPLE_ACCEPT = re.compile(r'^[^,;*/\s]+/[^,;*/\s]+$')
+
+
+class _NegotiationIndex(object):
+    """
+    Index of a request method's dispatchers by accepted media type.
+
+    The index resolves an Accept header that is a single media type without
+    parameters, e.g. 'application/json', to the same dispatcher and content
+    type as a full content negotiation, but without parsing all the supported
+    types.
+    """
+
+    def __init__(self, dispatchers):
+        # Flag if any dispatcher's content type has parameters.
+        self.content_type_params = False
+        for dispatcher in dispatchers:
+            for content_type in dispatcher[1]['content_type']:
+                if ';' in content_type:
+                    self.content_type_params = True
+        # Map of (type, subtype) to the (dispatcher, accept) for the largest
+        # (as sorted by mimeparse) accept type with that type and subtype. The
+        # dispatcher is the first one accepting that type.
+        self.index = {}
+        for dispatcher in dispatchers:
+            for accept in dispatcher[1]['accept']:
+                try:
+                    type, subtype, params = mimeparse.parse_mime_type(accept)
+                except ValueError:
+                    # Leave unparseable types to mimeparse.
+                    self.index = None
+                    return
+                found = self.index.get((type, subtype))
+                if found is None or accept > found[1]:
+                    self.index[(type, subtype)] = dispatcher, accept
+
+    def lookup(self, accept):
+        """
+        Return the (dispatcher, content_type) for the Accept header, or None
+        if the header is not simple enough to be resolved by the index.
+        """
+        if self.index is None or not _SIMPLE_ACCEPT.match(accept):
+            return None
+        type, subtype = accept.split('/')
+        # Try the supported types in order of mimeparse's fitness.
+        for key in ((type, subtype), (type, '*'), ('*', subtype), ('*', '*')):
+            found = self.index.get(key)
+            if found is not None:
+                dispatcher, best_match = found
+                if '*' in best_match:
+                    return dispatcher, None
+                return dispatcher, best_match
+        return None, None
+
+
+def _content_type(dispatcher, request):
+    """
+    Work out the content type of the dispatcher's response.
+
+    If there's no accept from the client then use the first possible type from
+    the match. Otherwise use mimeparse to work out what the best match was. If
+    the best match is not a wildcard then we know what the content-type should
+    be.
     """
-    Find the best dispatcher for the request.
+    match = dispatcher[1]
+    accept = str(request.accept)
+    if not accept:
+        best_match = match['accept'][0]
+    else:
+        best_match = mimeparse.best_match(match['accept'], accept)
+    if '*' in best_match:
+        return None
+    return best_match
+
+
+def _best_dispatcher(dispatchers, request, content_type):
+    """
+    Find the best dispatcher for the request and its content type.
     """
     # Use content negotation to filter the dispatchers to an ordered list of
     # only those that match.
-    if request.headers.get('content-type'):
-        dispatchers = _filter_dispatchers_on_content_type(dispatchers, request)
+    if content_type:
+        dispatchers = _filter_dispatchers_on_content_type(dispatchers,
+                                                          content_type)
     if request.headers.get('accept'):
         dispatchers = _filter_dispatchers_on_accept(dispatchers, request)
     # Return the best match or None
@@ -145,14 +584,13 @@ def _best_dispatcher(dispatchers, request):
     else:
         return None
 
-def _filter_dispatchers_on_content_type(dispatchers, request):
+def _filter_dispatchers_on_content_type(dispatchers, content_type):
     # Build an ordered list of the supported types.
     supported = []
     for d in dispatchers:
         supported.extend(d[1]['content_type'])
     # Find the best type.
-    best_match = mimeparse.best_match(supported, \
-                                      str(request.headers['content-type']))
+    best_match = mimeparse.best_match(supported, str(content_type))
     # Return the matching dispatchers
     return [d for d in dispatchers if best_match in d[1]['content_type']]
 
@@ -168,8 +606,14 @@ def _filter_dispatchers_on_accept(dispatchers, request):
     return [d for d in dispatchers if best_match in d[1]['accept']]
 
 
-def child(matcher=None):
-    """ Child decorator used for finding child resources """
+def child(matcher=None, name=None, parent=None):
+    """
+    Child decorator used for finding child resources
+
+    A child with a template pattern can be given a route name to build its
+    URL from, see Routes. parent is the name of the route to the resource the
+    child is found from, if not the root resource.
+    """
     def decorator(func, matcher=matcher):
         # No matcher? Use the function name.
         if matcher is None:
@@ -180,11 +624,162 @@ def child(matcher=None):
             matcher = TemplateChildMatcher(matcher)
         # Annotate the function.
         setattr(func, _RESTISH_CHILD, matcher)
+        if name is not None:
+            setattr(func, _RESTISH_ROUTE, (name, parent))
         # Return the function (unwrapped).
         return func
     return decorator
 
 
+class Routes(object):
+    """
+    Registry of named routes, used to build the URL of a resource from its
+    route name and the values of the pattern's {dynamic} segments.
+
+    Routes are registered by the Resource metaclass for each @child with a
+    name. The route's path is the parent route's path, if any, followed by the
+    child's pattern, e.g.
+
+        class Root(Resource):
+            @child('items', name='items')
+            def items(self, request, segments):
+                ...
+
+        class Items(Resource):
+            @child('{id}/edit', name='item_edit', parent='items')
+            def edit(self, request, segments, id):
+                ...
+
+        routes.path('item_edit', id=42) == '/items/42/edit'
+
+    Each route is compiled, when first used, into a format string of the
+    quoted static segments so that only the values need quoting.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._formatters = {}
+
+    def register(self, name, pattern, parent=None):
+        """
+        Register the route name for the pattern, relative to the parent route.
+
+        A name can only be registered again for the same pattern and parent,
+        e.g. when the module defining the resource is reloaded, otherwise a
+        ValueError is raised.
+        """
+        route = self._routes.get(name)
+        if route is not None and route != (pattern, parent):
+            raise ValueError("Route %r is already registered for %r" % \
+                             (name, route[0]))
+        self._routes[name] = (pattern, parent)
+        # Forget all compiled routes, any of them may have this as a parent.
+        self._formatters = {}
+
+    def __contains__(self, name):
+        return name in self._routes
+
+    def segments(self, name):
+        """
+        Return the route's list of pattern segments, including the parent's.
+        """
+        segments = []
+        seen = set()
+        while name is not None:
+            if name in seen:
+                raise ValueError("Route %r has a cyclic parent" % name)
+            seen.add(name)
+            pattern, name = self._routes[name]
+            segments[:0] = pattern.split('/')
+        return segments
+
+    def _formatter(self, name):
+        """
+        Return the route's (format, names) tuple, compiling it if necessary.
+        """
+        formatter = self._formatters.get(name)
+        if formatter is None:
+            parts, names = [], []
+            for segment in self.segments(name):
+                if _is_dynamic_segment(segment):
+                    parts.append('%%(%s)s' % segment[1:-1])
+                    names.append(segment[1:-1])
+                else:
+                    parts.append(_quote_segment(segment).replace('%', '%%'))
+            formatter = self._formatters[name] = ('/' + '/'.join(parts), \
+                                                  names)
+        return formatter
+
+    def path(self, name, **params):
+        """
+        Return the route's path, relative to the application, using the
+        params as the values of the {dynamic} segments.
+
+        Raises KeyError if the route or a value is missing.
+        """
+        format, names = self._formatter(name)
+        if not names:
+            return format
+        return format % dict((n, _quote_segment(params[n])) for n in names)
+
+    def url(self, request, name, **params):
+        """
+        Return the route's path, using the params as the values of the
+        {dynamic} segments, as a URL relative to the web server root.
+        """
+        return url.URL(request.application_path + self.path(name, **params))
+
+
+def _quote_segment(value):
+    """
+    Quote a value (converted to unicode if not a string) for a path segment.
+    """
+    if not isinstance(value, basestring):
+        value = unicode(value)
+    return url.join_path([value])[1:]
+
+
+# Routes registered by Resource classes.
+routes = Routes()
+
+
+def cacheable(obj):
+    """
+    Decorator to mark a Resource class or @child factory as cacheable.
+
+    When the application has a child cache (see app.RestishApp) it will reuse
+    the result of a child lookup that returned an instance of a cacheable
+    class, or that was made by a cacheable @child factory, for later requests
+    for the same segments. Only mark resources that do not depend on the
+    request in any way, e.g. static documentation or reference data.
+
+    Lookups are cached by the whole remaining path, so each distinct path
+    below a cacheable resource takes its own cache entry. Cacheable resources
+    with many children, e.g. one per id, need a correspondingly large cache.
+    """
+    setattr(obj, _RESTISH_CACHEABLE, True)
+    return obj
+
+
+class CacheableChild(tuple):
+    """
+    A (resource, segments) tuple, returned from resource_child, marking the
+    result of the child lookup as cacheable.
+    """
+
+
+def is_cacheable_child(result):
+    """
+    Test if the result of a resource_child call is cacheable, i.e. is a
+    CacheableChild or an instance of a cacheable resource class.
+    """
+    if isinstance(result, CacheableChild):
+        return True
+    if isinstance(result, tuple):
+        result = result[0]
+    return getattr(result, _RESTISH_CACHEABLE, False)
+
+
 class TemplateChildMatcher(object):
     """
     A @child matcher that parses a template in the form /fixed/{dynamic}/fixed,
@@ -199,7 +794,7 @@ class TemplateChildMatcher(object):
     def _calc_score(self):
         """ Return the score for this element """
         def score(segment):
-            if len(segment) >= 2 and segment[0] == '{' and segment[-1] == '}':
+            if _is_dynamic_segment(segment):
                 return 0
             return 1
         segments = self.pattern.split('/')
@@ -207,16 +802,24 @@ class TemplateChildMatcher(object):
 
     def _compile(self):
         """ compile the regexp to match segments """
+        segments = self.pattern.split('/')
+        self._count = len(segments)
+        self.names = [segment[1:-1] for segment in segments \
+                      if _is_dynamic_segment(segment)]
+        self._regex = re.compile('^' + self._expression() + '$')
+
+    def _expression(self, prefix=''):
+        """
+        Return the regexp source to match segments, optionally prefixing the
+        group names.
+        """
         def re_segments(segments):
             for segment in segments:
-                if len(segment) >= 2 and \
-                   segment[0] == '{' and segment[-1] == '}':
-                    yield '(?P<%s>.*?)' % segment[1:-1]
+                if _is_dynamic_segment(segment):
+                    yield '(?P<%s%s>.*?)' % (prefix, segment[1:-1])
                 else:
                     yield segment
-        segments = self.pattern.split('/')
-        self._count = len(segments)
-        self._regex = re.compile('^' + '\\/'.join(re_segments(segments)) + '$')
+        return '\\/'.join(re_segments(self.pattern.split('/')))
 
     def __call__(self, request, segments):
         match_segments, remaining_segments = \
@@ -273,9 +876,38 @@ class DELETE(MethodDecorator):
 
 
 class GET(MethodDecorator):
-    """ http GET method """
+    """
+    http GET method, also used for HEAD without an explicit handler
+
+    etag and last_modified are optional validator callables, called as
+    etag(resource, request) and last_modified(resource, request) before the
+    handler. They return the resource's current (unquoted) entity tag and
+    modification datetime (naive datetimes are UTC), or None if unknown. If
+    the request's If-None-Match or If-Modified-Since header matches, a 304 Not
+    Modified response is sent without calling the handler. Otherwise, the
+    ETag and Last-Modified headers are added to the handler's response.
+    """
     method = 'GET'
 
+    def __init__(self, accept='*/*', content_type='*/*', etag=None,
+                 last_modified=None):
+        super(GET, self).__init__(accept, content_type)
+        if etag is None and last_modified is None:
+            self.validators = None
+        else:
+            self.validators = etag, last_modified
+
+    def __call__(self, func):
+        func = super(GET, self).__call__(func)
+        if self.validators is not None:
+            setattr(func, _RESTISH_VALIDATORS, self.validators)
+        return func
+
+
+class HEAD(MethodDecorator):
+    """ http HEAD method """
+    method = 'HEAD'
+
 
 class POST(MethodDecorator):
     """ http POST method """
@@ -1,12 +1,16 @@
 """
 Templating support.
 """
+import codecs
 
 from restish import http, url, util
 from restish.page import Element
 
 
 class Templating(object):
+
+    # Minimum size, in bytes, of the chunks of a streamed page.
+    chunk_size = 8192
     
     def __init__(self, renderer):
         self.renderer = renderer
@@ -17,6 +21,28 @@ class Templating(object):
         """
         return self.renderer(template, args, encoding=encoding)
 
+    def stream(self, request, template, args=None, encoding='utf-8',
+               chunk_size=None):
+        """
+        Render the template and args as an iterator of byte strings, encoded
+        incrementally and buffered to chunks of at least chunk_size bytes
+        (except the last), defaulting to the chunk_size attribute.
+
+        The renderer's stream method, if it has one, is called to render the
+        template to an iterable of unicode (or encoded) pieces as it goes,
+        passing the encoding so that the renderer can encode the pieces the
+        same way it encodes a rendered template. Otherwise the whole template
+        is rendered when the first chunk is needed.
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        stream = getattr(self.renderer, 'stream', None)
+        if stream is None:
+            pieces = _rendered(self.renderer, template, args)
+        else:
+            pieces = stream(template, args, encoding=encoding)
+        return _chunked(pieces, encoding, chunk_size)
+
     def args(self, request):
         """
         Return a dict of args that should always be present.
@@ -112,6 +138,70 @@ def render_page(request, page, template, args={}, encoding='utf-8'):
     return templating.render(request, template, args=args_, encoding=encoding)
 
 
+def stream_page(request, page, template, args={}, encoding='utf-8',
+                chunk_size=None):
+    """
+    Render a page using the template and args, like render_page, as an
+    iterator of encoded chunks. The template is rendered as the chunks are
+    iterated.
+
+    :arg request:
+        Request instance.
+    :arg page:
+        Page being rendered (hint, it's often self).
+    :arg template:
+        Name of the template file.
+    :arg args:
+        Dictionary of args to pass to the template renderer.
+    :arg encoding:
+        Optional encoding of output, default to 'utf-8'.
+    :arg chunk_size:
+        Optional minimum size of the chunks, defaults to the Templating's
+        chunk_size.
+    """
+    # Lookup the templating implementation.
+    templating = request.environ['restish.templating']
+    # Combine common page args with those passed in.
+    args_ = templating.page_args(request, page)
+    args_.update(args)
+    # Return the streamed template.
+    return templating.stream(request, template, args=args_, encoding=encoding,
+                             chunk_size=chunk_size)
+
+
+def _rendered(renderer, template, args):
+    """
+    Render the template and args, to unicode, when first iterated.
+    """
+    yield renderer(template, args, encoding=None)
+
+
+def _chunked(pieces, encoding, chunk_size):
+    """
+    Encode the unicode pieces, and buffer them, to chunks of at least
+    chunk_size bytes. Byte string pieces are assumed to be encoded already.
+    """
+    encode = codecs.getincrementalencoder(encoding)().encode
+    # Only finish the encoder if it was used, finishing an unused encoder
+    # writes a stray BOM for codecs such as utf-16.
+    encoded = False
+    buffer, size = [], 0
+    for piece in pieces:
+        if isinstance(piece, unicode):
+            piece = encode(piece)
+            encoded = True
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if encoded:
+        buffer.append(encode(u'', True))
+    chunk = ''.join(buffer)
+    if chunk:
+        yield chunk
+
+
 def render_response(request, page, template, args={},
                     type='text/html', encoding='utf-8'):
     """
@@ -131,16 +221,70 @@ def render_response(request, page, template, args={},
         Optional mime type of content, defaults to 'text/html'
     :arg encoding:
         Optional encoding of output, default to 'utf-8'.
+
+    The page is not rendered for a HEAD request, the response has no body and
+    no Content-Length header.
     """
-    return http.ok([('Content-Type', "%s; charset=%s"%(type, encoding))],
-                   render_page(request, page, template, args,
-                               encoding=encoding))
+    headers = [('Content-Type', "%s; charset=%s"%(type, encoding))]
+    if request.method == 'HEAD':
+        return _head_response(headers)
+    return http.ok(headers, render_page(request, page, template, args,
+                                        encoding=encoding))
 
 
-def page(template, type='text/html', encoding='utf-8'):
+def stream_response(request, page, template, args={},
+                    type='text/html', encoding='utf-8', chunk_size=None):
     """
-    Convenience decorator that calls render_response, passing the dict
-    returned from calling the decorated method as the template 'args'.
+    Render a page, using the template and args, and return a '200 OK'
+    response whose body is streamed, see stream_page. The response's
+    Content-Type header will be constructed from the type and encoding.
+
+    The response has no Content-Length header and, as the page is rendered
+    while the body is sent, an error rendering the template can only cut the
+    response short.
+
+    :arg request:
+        Request instance.
+    :arg page:
+        Page being rendered (hint, it's often self).
+    :arg template:
+        Name of the template file.
+    :arg args:
+        Dictionary of args to pass to the template renderer.
+    :arg type:
+        Optional mime type of content, defaults to 'text/html'
+    :arg encoding:
+        Optional encoding of output, default to 'utf-8'.
+    :arg chunk_size:
+        Optional minimum size of the chunks, defaults to the Templating's
+        chunk_size.
+
+    The page is not rendered for a HEAD request.
+    """
+    headers = [('Content-Type', "%s; charset=%s"%(type, encoding))]
+    if request.method == 'HEAD':
+        return _head_response(headers)
+    return http.ok(headers, stream_page(request, page, template, args,
+                                        encoding=encoding,
+                                        chunk_size=chunk_size))
+
+
+def _head_response(headers):
+    """
+    Return the '200 OK' response to a HEAD request for a page, without
+    rendering it, so with no body and no Content-Length header.
+    """
+    response = http.ok(headers, None)
+    del response.headers['Content-Length']
+    return response
+
+
+def page(template, type='text/html', encoding='utf-8', stream=False,
+         chunk_size=None):
+    """
+    Convenience decorator that calls render_response, or stream_response if
+    stream is true, passing the dict returned from calling the decorated
+    method as the template 'args'.
 
     The decorated method's first argument must be a http.Request instance. All
     arguments (including the request) are passed on as-is.
@@ -157,10 +301,18 @@ def page(template, type='text/html', encoding='utf-8'):
         Optional mime type of content, defaults to 'text/html'
     :arg encoding:
         Optional encoding of output, default to 'utf-8'.
+    :arg stream:
+        Optional flag to stream the page, defaults to False.
+    :arg chunk_size:
+        Optional minimum size of a streamed page's chunks.
     """
     def decorator(func):
         def decorated(page, request, *a, **k):
             args = func(page, request, *a, **k)
+            if stream:
+                return stream_response(request, page, template, args,
+                                       type=type, encoding=encoding,
+                                       chunk_size=chunk_size)
             return render_response(request, page, template, args, type=type,
                                    encoding=encoding)
         return decorated
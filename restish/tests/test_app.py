@@ -173,6 +173,237 @@ class TestApp(unittest.TestCase):
         A = app.RestishApp(resource)
         assert wsgi_out(A, http.Request.blank('/').environ)['body'] == 'Three ... two ... one ... BANG!'
 
+    def test_head(self):
+        A = app.RestishApp(Resource('root'))
+        out = wsgi_out(A, http.Request.blank('/', environ={'REQUEST_METHOD': 'HEAD'}).environ)
+        assert out['status'].startswith('200')
+        assert ('Content-Length', '4') in out['headers']
+        assert out['body'] == ''
+
+    def test_lazy_request(self):
+        requests = []
+        class Resource(resource.Resource):
+            @resource.GET()
+            def GET(self, request):
+                requests.append(request)
+                return http.ok([('Content-Type', 'text/plain')], str(request.url))
+        A = app.RestishApp(Resource(), lazy_request=True)
+        R = wsgi_out(A, http.Request.blank('/').environ)
+        assert R['body'] == 'http://localhost/'
+        assert isinstance(requests[0], http.LazyRequest)
+
+    def test_head_iterable_not_consumed(self):
+        consumed = []
+        class Body(object):
+            closed = False
+            def __iter__(self):
+                consumed.append(True)
+                yield 'body'
+            def close(self):
+                self.closed = True
+        body = Body()
+        def resource(request):
+            return http.ok([('Content-Type', 'text/plain')], body)
+        A = app.RestishApp(resource)
+        out = wsgi_out(A, http.Request.blank('/', environ={'REQUEST_METHOD': 'HEAD'}).environ)
+        assert out['body'] == ''
+        assert consumed == []
+        assert body.closed
+
+
+class TestChildCache(unittest.TestCase):
+
+    def _resource(self, calls):
+        class Leaf(resource.Resource):
+            def __init__(self, name):
+                self.name = name
+            def __call__(self, request):
+                return http.ok([('Content-Type', 'text/plain')], self.name)
+        class CacheableLeaf(Leaf):
+            pass
+        resource.cacheable(CacheableLeaf)
+        class Root(resource.Resource):
+            @resource.child()
+            def plain(self, request, segments):
+                calls.append('plain')
+                return Leaf('plain')
+            @resource.child()
+            def marked(self, request, segments):
+                calls.append('marked')
+                return CacheableLeaf('marked')
+            @resource.child('factory/{name}')
+            @resource.cacheable
+            def factory(self, request, segments, name):
+                calls.append('factory')
+                return Leaf(name.encode('utf-8'))
+            def __call__(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'root')
+        return Root()
+
+    def test_not_cached_by_default(self):
+        calls = []
+        A = app.RestishApp(self._resource(calls))
+        assert A.child_cache is None
+        for i in range(2):
+            assert wsgi_out(A, http.Request.blank('/marked').environ)['body'] == 'marked'
+        assert calls == ['marked', 'marked']
+
+    def test_cacheable_class(self):
+        calls = []
+        A = app.RestishApp(self._resource(calls), child_cache_size=10)
+        for i in range(3):
+            assert wsgi_out(A, http.Request.blank('/marked').environ)['body'] == 'marked'
+        assert calls == ['marked']
+        assert (A.child_cache.hits, A.child_cache.misses) == (2, 1)
+
+    def test_cacheable_factory(self):
+        calls = []
+        A = app.RestishApp(self._resource(calls), child_cache_size=10)
+        for i in range(2):
+            assert wsgi_out(A, http.Request.blank('/factory/foo').environ)['body'] == 'foo'
+            assert wsgi_out(A, http.Request.blank('/factory/bar').environ)['body'] == 'bar'
+        assert calls == ['factory', 'factory']
+
+    def test_not_cacheable(self):
+        calls = []
+        A = app.RestishApp(self._resource(calls), child_cache_size=10)
+        for i in range(2):
+            assert wsgi_out(A, http.Request.blank('/plain').environ)['body'] == 'plain'
+        assert calls == ['plain', 'plain']
+        assert len(A.child_cache) == 0
+
+    def test_bounded(self):
+        calls = []
+        A = app.RestishApp(self._resource(calls), child_cache_size=1)
+        wsgi_out(A, http.Request.blank('/factory/foo').environ)
+        wsgi_out(A, http.Request.blank('/factory/bar').environ)
+        wsgi_out(A, http.Request.blank('/factory/foo').environ)
+        assert calls == ['factory', 'factory', 'factory']
+        assert len(A.child_cache) == 1
+
+
+class TestNotFoundCache(unittest.TestCase):
+
+    def _app(self, calls, **kwargs):
+        class Resource(resource.Resource):
+            def resource_child(self, request, segments):
+                calls.append(segments)
+                if segments[0] == 'found':
+                    return lambda request: http.ok([], 'found'), []
+            def __call__(self, request):
+                return http.ok([], 'root')
+        return app.RestishApp(Resource(), **kwargs)
+
+    def test_not_cached_by_default(self):
+        calls = []
+        A = self._app(calls)
+        assert A.not_found_cache is None
+        for i in range(2):
+            assert wsgi_out(A, http.Request.blank('/missing').environ)['status'].startswith('404')
+        assert len(calls) == 2
+
+    def test_cached(self):
+        calls = []
+        A = self._app(calls, not_found_cache_size=10)
+        for i in range(3):
+            R = wsgi_out(A, http.Request.blank('/missing').environ)
+            assert R['status'].startswith('404')
+            assert R['body'] == '404 Not Found'
+            assert ('Content-Type', 'text/plain') in R['headers']
+        assert len(calls) == 1
+        assert wsgi_out(A, http.Request.blank('/found').environ)['body'] == 'found'
+        assert wsgi_out(A, http.Request.blank('/found').environ)['body'] == 'found'
+        assert len(calls) == 3
+
+    def test_cached_head(self):
+        calls = []
+        A = self._app(calls, not_found_cache_size=10)
+        for i in range(2):
+            R = wsgi_out(A, http.Request.blank('/missing', environ={'REQUEST_METHOD': 'HEAD'}).environ)
+            assert R['status'].startswith('404')
+            assert R['body'] == ''
+        assert len(calls) == 1
+
+    def test_long_path(self):
+        calls = []
+        A = self._app(calls, not_found_cache_size=10)
+        path = '/' + 'x' * A.not_found_max_path_length
+        for i in range(2):
+            assert wsgi_out(A, http.Request.blank(path).environ)['status'].startswith('404')
+        assert len(calls) == 2
+        assert len(A.not_found_cache) == 0
+
+    def test_ttl(self):
+        calls = []
+        A = self._app(calls, not_found_cache_size=10, not_found_ttl=0)
+        for i in range(2):
+            assert wsgi_out(A, http.Request.blank('/missing').environ)['status'].startswith('404')
+        assert len(calls) == 2
+
+
+class TestLimits(unittest.TestCase):
+
+    def _app(self, calls, **kwargs):
+        class Resource(resource.Resource):
+            def resource_child(self, request, segments):
+                calls.append(segments)
+                return self, []
+            def __call__(self, request):
+                return http.ok([], 'ok')
+        return app.RestishApp(Resource(), **kwargs)
+
+    def _status(self, A, path, **environ):
+        E = http.Request.blank(path).environ
+        E.update(environ)
+        return wsgi_out(A, E)['status']
+
+    def test_unlimited(self):
+        calls = []
+        A = self._app(calls)
+        assert self._status(A, '/' + 'x/' * 1000 + '?' + 'a&' * 1000).startswith('200')
+        assert not sum(A.rejected.values())
+
+    def test_path(self):
+        calls = []
+        A = self._app(calls, max_path_length=8, max_path_segments=3)
+        assert self._status(A, '/a/b/c').startswith('200')
+        assert self._status(A, '/a/b/c/d').startswith('400')
+        assert self._status(A, '/abcdefgh').startswith('400')
+        assert len(calls) == 1
+        assert A.rejected['path_length'] == 1
+        assert A.rejected['path_segments'] == 1
+
+    def test_head(self):
+        calls = []
+        A = self._app(calls, max_path_length=8)
+        R = wsgi_out(A, http.Request.blank('/abcdefgh', environ={'REQUEST_METHOD': 'HEAD'}).environ)
+        assert R['status'].startswith('400')
+        assert R['body'] == ''
+        assert not calls
+        assert A.rejected['path_length'] == 1
+
+    def test_query(self):
+        calls = []
+        A = self._app(calls, max_query_length=12, max_query_params=3)
+        assert self._status(A, '/a?a=1&b=2&c=3').startswith('200')
+        # ';' is not a separator.
+        assert self._status(A, '/a?a=1;2;3;4').startswith('200')
+        R = wsgi_out(A, http.Request.blank('/a?a&b&c&d').environ)
+        assert R['status'].startswith('400')
+        assert R['body'] == '400 Bad Request'
+        assert self._status(A, '/a?a=1234567890123').startswith('400')
+        assert A.rejected['query_params'] == 1
+        assert A.rejected['query_length'] == 1
+
+    def test_headers(self):
+        calls = []
+        A = self._app(calls, max_header_length=20)
+        assert self._status(A, '/', HTTP_ACCEPT='text/html').startswith('200')
+        assert self._status(A, '/', HTTP_ACCEPT='text/html,' * 10).startswith('400')
+        assert self._status(A, '/', HTTP_IF_NONE_MATCH='"x"' * 10).startswith('400')
+        assert self._status(A, '/', HTTP_USER_AGENT='x' * 30).startswith('200')
+        assert A.rejected['header_length'] == 2
+
 
 class CallableResource(object):
     def __call__(self, request):
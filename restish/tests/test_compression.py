@@ -0,0 +1,248 @@
+import gzip
+import StringIO
+import unittest
+import zlib
+
+from restish import app, compression, http, resource, templating
+from restish.tests.util import wsgi_out
+
+
+BODY = 'compressible text ' * 100
+
+
+class Resource(resource.Resource):
+    def __init__(self, body, headers=None, status=None):
+        self.body = body
+        self.headers = headers
+        self.status = status
+    def __call__(self, request):
+        headers = [('Content-Type', 'text/plain')]
+        if self.headers is not None:
+            headers = self.headers
+        if self.status is not None:
+            return http.Response(self.status, list(headers), self.body)
+        return http.ok(list(headers), self.body)
+
+
+class ClosingIter(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+    def __iter__(self):
+        return iter(self.chunks)
+    def close(self):
+        self.closed = True
+
+
+def get(resource, accept_encoding='gzip', compressor=None, **environ):
+    if compressor is None:
+        compressor = compression.Compressor()
+    if accept_encoding is not None:
+        environ['HTTP_ACCEPT_ENCODING'] = accept_encoding
+    A = app.RestishApp(resource, compression=compressor)
+    R = wsgi_out(A, http.Request.blank('/', environ=environ).environ)
+    R['headers'] = dict(R['headers'])
+    return R
+
+
+def gunzip(body):
+    return gzip.GzipFile(fileobj=StringIO.StringIO(body)).read()
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_gzip(self):
+        R = get(Resource(BODY))
+        assert R['status'].startswith('200')
+        assert R['headers']['Content-Encoding'] == 'gzip'
+        assert R['headers']['Vary'] == 'Accept-Encoding'
+        assert R['headers']['Content-Length'] == str(len(R['body']))
+        assert len(R['body']) < len(BODY)
+        assert gunzip(R['body']) == BODY
+
+    def test_deflate(self):
+        R = get(Resource(BODY), 'deflate')
+        assert R['headers']['Content-Encoding'] == 'deflate'
+        assert zlib.decompress(R['body']) == BODY
+
+    def test_negotiation(self):
+        assert compression._coding(None) is None
+        assert compression._coding('identity') is None
+        assert compression._coding('gzip;q=0, deflate;q=0') is None
+        assert compression._coding('gzip, deflate') == 'gzip'
+        assert compression._coding('gzip;q=0.5, deflate') == 'deflate'
+        assert compression._coding('*') == 'gzip'
+
+    def test_not_accepted(self):
+        R = get(Resource(BODY), None)
+        assert 'Content-Encoding' not in R['headers']
+        assert R['headers']['Vary'] == 'Accept-Encoding'
+        assert R['body'] == BODY
+        R = get(Resource(BODY), 'identity')
+        assert 'Content-Encoding' not in R['headers']
+        assert R['body'] == BODY
+
+    def test_app_iter(self):
+        app_iter = ClosingIter([BODY[:500], BODY[500:1000], BODY[1000:]])
+        R = get(Resource(app_iter))
+        assert R['headers']['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in R['headers']
+        assert gunzip(R['body']) == BODY
+        assert app_iter.closed
+
+    def test_app_iter_incremental(self):
+        # Chunks are compressed as they're iterated, not all up front.
+        iterated = []
+        def chunks():
+            for i in range(3):
+                iterated.append(i)
+                yield BODY
+        response = compression.Compressor().compress(
+            {'HTTP_ACCEPT_ENCODING': 'gzip'},
+            http.ok([('Content-Type', 'text/plain')], chunks()))
+        assert iterated == []
+        body = ''.join(response.app_iter)
+        assert iterated == [0, 1, 2]
+        assert gunzip(body) == BODY * 3
+
+    def test_app_iter_flushed(self):
+        # Each chunk is flushed so the client can decompress it straight away.
+        chunks = ['<html>' + 'a' * 2000, 'b' * 2000, 'c' * 2000]
+        response = compression.Compressor().compress(
+            {'HTTP_ACCEPT_ENCODING': 'gzip'},
+            http.ok([('Content-Type', 'text/html')], iter(chunks)))
+        app_iter = iter(response.app_iter)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            assert decompressor.decompress(app_iter.next()) == chunk
+        assert decompressor.decompress(''.join(app_iter)) == ''
+        # Without flushing the output is held back.
+        response = compression.Compressor(sync_flush=False).compress(
+            {'HTTP_ACCEPT_ENCODING': 'gzip'},
+            http.ok([('Content-Type', 'text/html')], iter(chunks)))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        assert decompressor.decompress(iter(response.app_iter).next()) == ''
+
+    def test_small(self):
+        R = get(Resource('small'))
+        assert 'Content-Encoding' not in R['headers']
+        assert 'Vary' not in R['headers']
+        assert R['body'] == 'small'
+        R = get(Resource('small'),
+                compressor=compression.Compressor(min_size=0))
+        assert gunzip(R['body']) == 'small'
+
+    def test_content_types(self):
+        for content_type in ['text/html; charset=utf-8', 'application/json',
+                             'application/atom+xml', 'image/svg+xml']:
+            R = get(Resource(BODY, [('Content-Type', content_type)]))
+            assert R['headers']['Content-Encoding'] == 'gzip', content_type
+        for content_type in ['image/png', 'application/zip',
+                             'application/octet-stream']:
+            R = get(Resource(BODY, [('Content-Type', content_type)]))
+            assert 'Content-Encoding' not in R['headers'], content_type
+            assert 'Vary' not in R['headers']
+            assert R['body'] == BODY
+        R = get(Resource(BODY, []))
+        assert 'Content-Encoding' not in R['headers']
+
+    def test_already_encoded(self):
+        R = get(Resource('gzipped', [('Content-Type', 'text/plain'),
+                                     ('Content-Encoding', 'gzip')]))
+        assert R['headers']['Content-Encoding'] == 'gzip'
+        assert R['body'] == 'gzipped'
+
+    def test_no_body_status(self):
+        R = get(Resource(None, [('Content-Type', 'text/plain')],
+                         '304 Not Modified'))
+        assert 'Content-Encoding' not in R['headers']
+        assert R['body'] == ''
+
+    def test_vary(self):
+        R = get(Resource(BODY, [('Content-Type', 'text/plain'),
+                                ('Vary', 'Accept')]))
+        assert R['headers']['Vary'] == 'Accept, Accept-Encoding'
+        R = get(Resource(BODY, [('Content-Type', 'text/plain'),
+                                ('Vary', 'accept-encoding')]))
+        assert R['headers']['Vary'] == 'accept-encoding'
+        R = get(Resource(BODY, [('Content-Type', 'text/plain'),
+                                ('Vary', '*')]))
+        assert R['headers']['Vary'] == '*'
+
+    def test_etag(self):
+        R = get(Resource(BODY, [('Content-Type', 'text/plain'),
+                                ('ETag', '"abc"'), ('Accept-Ranges', 'bytes')]))
+        assert R['headers']['ETag'] == 'W/"abc"'
+        assert 'Accept-Ranges' not in R['headers']
+        R = get(Resource(BODY, [('Content-Type', 'text/plain'),
+                                ('ETag', '"abc"')]), None)
+        assert R['headers']['ETag'] == '"abc"'
+
+    def test_range(self):
+        # Ranges are of the uncompressed body and sent uncompressed.
+        R = get(Resource(BODY, [('Content-Type', 'text/plain'),
+                                ('Accept-Ranges', 'bytes')]),
+                HTTP_RANGE='bytes=0-9')
+        assert R['status'].startswith('206')
+        assert 'Content-Encoding' not in R['headers']
+        assert R['body'] == BODY[:10]
+
+    def test_head(self):
+        R = get(Resource(BODY), REQUEST_METHOD='HEAD')
+        assert 'Content-Encoding' not in R['headers']
+        assert R['headers']['Content-Length'] == str(len(BODY))
+        assert R['body'] == ''
+
+    def test_head_page(self):
+        # A page's HEAD response has no body and no Content-Length, which
+        # must not become the Content-Length of a compressed empty body.
+        def renderer(template, args, encoding=None):
+            return BODY
+        class Page(resource.Resource):
+            @resource.GET()
+            @templating.page('page')
+            def html(self, request):
+                return {}
+        R = get(Page(), REQUEST_METHOD='HEAD',
+                **{'restish.templating': templating.Templating(renderer)})
+        assert 'Content-Encoding' not in R['headers']
+        assert 'Content-Length' not in R['headers']
+        assert R['body'] == ''
+
+    def test_cache(self):
+        compressor = compression.Compressor(cache_size=10)
+        R1 = get(Resource(BODY), compressor=compressor)
+        assert len(compressor.cache) == 1
+        R2 = get(Resource(BODY), compressor=compressor)
+        assert len(compressor.cache) == 1
+        assert R1['body'] == R2['body']
+        get(Resource(BODY), 'deflate', compressor=compressor)
+        assert len(compressor.cache) == 2
+        # Streamed bodies are not cached.
+        get(Resource(iter([BODY])), compressor=compressor)
+        assert len(compressor.cache) == 2
+        # Bodies are cached by identity, an equal body built for the request
+        # is compressed again.
+        body = ''.join(list(BODY))
+        R3 = get(Resource(body), compressor=compressor)
+        assert R3['body'] == R1['body']
+        assert compressor.cache.hits == 1
+
+    def test_cache_limits(self):
+        compressor = compression.Compressor(cache_size=10,
+                                            max_cached_body_size=len(BODY) - 1)
+        get(Resource(BODY), compressor=compressor)
+        assert len(compressor.cache) == 0
+        compressor = compression.Compressor(cache_size=10,
+                                            cache_bytes=2 * len(BODY))
+        bodies = ['%d %s' % (i, BODY) for i in range(3)]
+        for body in bodies:
+            R = get(Resource(body), compressor=compressor)
+            assert gunzip(R['body']) == body
+        # Both the bodies and the compressed bytes count.
+        assert compressor.cache.bytes <= 2 * len(BODY)
+        assert len(compressor.cache) == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,14 @@
 # ~*~ coding: utf-8
 
+import gzip
+import os
+import shutil
+import tempfile
 import unittest
 
-from restish import http, templating
-from restish.contrib import appurl
+from restish import app, http, resource, templating
+from restish.contrib import appurl, static
+from restish.tests.util import wsgi_out
 
 
 TEST_STRING = "A '£' symbol often breaks web pages.".decode('utf-8')
@@ -161,6 +166,211 @@ else:
         renderer = MockTempitaRenderer()
 
 
+class StreamTests(object):
+    """
+    Compare a real renderer's stream with rendering the whole template.
+    """
+
+    args = {'items': range(200), 'name': TEST_STRING}
+
+    def test_stream(self):
+        for encoding in [None, 'utf-8', 'utf-16', 'iso-8859-1', 'ascii']:
+            rendered = self.renderer(self.template, dict(self.args),
+                                     encoding=encoding)
+            pieces = list(self.renderer.stream(self.template, dict(self.args),
+                                               encoding=encoding))
+            if encoding is None:
+                assert u''.join(pieces) == rendered
+            else:
+                assert ''.join(pieces) == rendered, encoding
+
+    def test_stream_page(self):
+        request = http.Request.blank('/', environ={
+            'restish.templating': templating.Templating(self.renderer)})
+        for encoding in ['utf-8', 'utf-16']:
+            chunks = templating.stream_page(request, None, self.template,
+                                            self.args, encoding=encoding,
+                                            chunk_size=64)
+            assert ''.join(chunks) == templating.render_page(
+                request, None, self.template, self.args, encoding=encoding)
+
+
+try:
+    import jinja2
+    from restish.contrib import jinja2renderer
+except ImportError:
+    pass
+else:
+    class TestJinja2Stream(StreamTests, unittest.TestCase):
+        template = 'page.html'
+        renderer = jinja2renderer.Jinja2Renderer(loader=jinja2.DictLoader({
+            'page.html': u'<p>{{ name }}</p>{% for i in items %}'
+                         u'<li>{{ i }} \u20ac</li>{% endfor %}'}))
+        def test_stream(self):
+            # Jinja2 encodes strictly, as render does.
+            self.assertRaises(UnicodeEncodeError, list, self.renderer.stream(
+                self.template, dict(self.args), encoding='ascii'))
+            for encoding in [None, 'utf-8', 'utf-16']:
+                rendered = self.renderer(self.template, dict(self.args),
+                                         encoding=encoding)
+                pieces = list(self.renderer.stream(
+                    self.template, dict(self.args), encoding=encoding))
+                assert len(pieces) > 1
+                if encoding is None:
+                    assert u''.join(pieces) == rendered
+                else:
+                    assert ''.join(pieces) == rendered, encoding
+
+
+try:
+    from restish.contrib import genshirenderer
+except ImportError:
+    pass
+else:
+    class TestGenshiStream(StreamTests, unittest.TestCase):
+        template = 'page.html'
+        def setUp(self):
+            self.directory = tempfile.mkdtemp()
+            f = open(os.path.join(self.directory, self.template), 'wb')
+            f.write(u'<div xmlns:py="http://genshi.edgewall.org/">'
+                    u'<p>${name}</p><ul><li py:for="i in items">${i} \u20ac'
+                    u'</li></ul></div>'.encode('utf-8'))
+            f.close()
+            self.renderer = genshirenderer.GenshiRenderer([self.directory])
+        def tearDown(self):
+            shutil.rmtree(self.directory)
+
+
+class TestStaticResource(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.directory, 'css'))
+        self._write('css/site.css', 'body {}')
+        self._write('big.bin', 'x' * 100)
+        self.static = static.StaticResource(self.directory, max_cached_file_size=50,
+                                            poll_interval=0, watch=False)
+        class Root(resource.Resource):
+            @resource.child('static')
+            def child(self_, request, segments):
+                return self.static
+        self.app = app.RestishApp(Root())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, name, content):
+        f = open(os.path.join(self.directory, name), 'wb')
+        f.write(content)
+        f.close()
+
+    def _get(self, path, **environ):
+        E = http.Request.blank(path).environ
+        E.update(environ)
+        R = wsgi_out(self.app, E)
+        R['headers'] = dict(R['headers'])
+        return R
+
+    def test_small(self):
+        self.static.poll_interval = 60
+        R = self._get('/static/css/site.css')
+        assert R['status'].startswith('200')
+        assert R['body'] == 'body {}'
+        assert R['headers']['Content-Type'] == 'text/css'
+        assert R['headers']['Content-Length'] == '7'
+        assert R['headers']['ETag'].startswith('"')
+        assert 'Vary' not in R['headers']
+        # Served from the cache, even after the file is removed.
+        os.remove(os.path.join(self.directory, 'css/site.css'))
+        assert self._get('/static/css/site.css')['body'] == 'body {}'
+        assert self.static.cache.hits == 1
+
+    def test_large(self):
+        R = self._get('/static/big.bin')
+        assert R['status'].startswith('200')
+        assert R['body'] == 'x' * 100
+        assert R['headers']['Content-Type'] == 'application/octet-stream'
+        assert R['headers']['Content-Length'] == '100'
+        entry = self.static.cache.get(os.path.join(self.directory, 'big.bin'))
+        assert entry.body is None
+        R = self._get('/static/big.bin', HTTP_RANGE='bytes=0-9')
+        assert R['status'].startswith('206')
+        assert R['body'] == 'x' * 10
+
+    def test_not_found(self):
+        for path in ['/static/missing', '/static/css', '/static/css/', '/static/../static/big.bin',
+                     '/static/css/%2E%2E/big.bin', '/static/']:
+            assert self._get(path)['status'].startswith('404'), path
+        # Missing paths are not cached, so they can't evict the files.
+        assert len(self.static.cache) == 0
+
+    def test_cache_bytes(self):
+        self.static = static.StaticResource(self.directory, max_cache_bytes=10,
+                                            max_cached_file_size=50,
+                                            poll_interval=60, watch=False)
+        self._write('a.txt', 'a' * 6)
+        self._write('b.txt', 'b' * 6)
+        assert self._get('/static/a.txt')['body'] == 'a' * 6
+        assert self._get('/static/b.txt')['body'] == 'b' * 6
+        assert self.static.cache.bytes == 6
+        assert os.path.join(self.directory, 'a.txt') not in self.static.cache
+        # Stat results of files with no cached content don't count.
+        assert self._get('/static/big.bin')['body'] == 'x' * 100
+        assert len(self.static.cache) == 2
+
+    def test_method(self):
+        R = self._get('/static/big.bin', REQUEST_METHOD='POST')
+        assert R['status'].startswith('405')
+        assert self._get('/static/big.bin', REQUEST_METHOD='HEAD')['body'] == ''
+
+    def test_not_modified(self):
+        R = self._get('/static/css/site.css')
+        R = self._get('/static/css/site.css', HTTP_IF_NONE_MATCH=R['headers']['ETag'])
+        assert R['status'].startswith('304')
+        assert R['body'] == ''
+
+    def test_changed(self):
+        assert self._get('/static/css/site.css')['body'] == 'body {}'
+        self._write('css/site.css', 'body { color: red; }')
+        assert self._get('/static/css/site.css')['body'] == 'body { color: red; }'
+        self._write('new.txt', 'new')
+        assert self._get('/static/new.txt')['body'] == 'new'
+
+    def test_changed_event(self):
+        class Event(object):
+            def __init__(self, pathname, dir=False):
+                self.pathname, self.dir = pathname, dir
+        self.static.poll_interval = 60
+        path = os.path.join(self.directory, 'css/site.css')
+        self._get('/static/css/site.css')
+        self.static._changed(Event(path + '.gz'))
+        assert path not in self.static.cache
+        self._get('/static/css/site.css')
+        self._get('/static/big.bin')
+        self.static._changed(Event(os.path.join(self.directory, 'css'), dir=True))
+        assert len(self.static.cache) == 0
+
+    def test_gzip(self):
+        f = gzip.open(os.path.join(self.directory, 'css/site.css.gz'), 'wb')
+        f.write('body {}')
+        f.close()
+        R = self._get('/static/css/site.css', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        assert R['headers']['Content-Encoding'] == 'gzip'
+        assert R['headers']['Content-Type'] == 'text/css'
+        assert R['headers']['Vary'] == 'Accept-Encoding'
+        gzip_etag = R['headers']['ETag']
+        assert R['body'][:2] == '\x1f\x8b'
+        for accept_encoding in [None, 'identity', 'gzip;q=0']:
+            environ = {}
+            if accept_encoding is not None:
+                environ['HTTP_ACCEPT_ENCODING'] = accept_encoding
+            R = self._get('/static/css/site.css', **environ)
+            assert R['body'] == 'body {}'
+            assert 'Content-Encoding' not in R['headers']
+            assert R['headers']['Vary'] == 'Accept-Encoding'
+            assert R['headers']['ETag'] != gzip_etag
+
+
 if __name__ == '__main__':
     unittest.main()
 
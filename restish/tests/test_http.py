@@ -42,6 +42,60 @@ class TestRequestAttributes(unittest.TestCase):
         self.assertEquals(r.application_path, '/foo/')
 
 
+class TestRequestURLCache(unittest.TestCase):
+
+    names = ['host_url', 'application_url', 'application_path', 'path_url',
+             'url', 'path', 'path_qs']
+
+    def test_cached(self):
+        environ = make_environ()
+        request = http.Request(environ)
+        for name in self.names:
+            assert getattr(request, name) is getattr(request, name)
+            assert getattr(http.Request(environ), name) is getattr(request, name)
+
+    def test_invalidated(self):
+        request = http.Request.blank('/bar/baz?a=1', base_url='/foo')
+        for name in self.names:
+            getattr(request, name)
+        request.environ['SCRIPT_NAME'] += '/bar'
+        request.environ['PATH_INFO'] = '/baz'
+        self.assertEquals(request.application_path, '/foo/bar')
+        self.assertEquals(request.application_url, 'http://localhost/foo/bar')
+        self.assertEquals(request.path_url, 'http://localhost/foo/bar/baz')
+        self.assertEquals(request.path, '/foo/bar/baz')
+        request.environ['QUERY_STRING'] = 'b=2'
+        self.assertEquals(request.url, 'http://localhost/foo/bar/baz?b=2')
+        self.assertEquals(request.path_qs, '/foo/bar/baz?b=2')
+        request.environ['HTTP_HOST'] = 'example.com'
+        self.assertEquals(request.host_url, 'http://example.com')
+
+
+class TestLazyRequest(unittest.TestCase):
+
+    def test_routing_attributes(self):
+        environ = make_environ(headers={'Accept': 'text/html'})
+        request = http.LazyRequest(environ)
+        assert request.environ is environ
+        assert request.method == 'GET'
+        assert request.path_info == '/bar'
+        assert request.headers['Accept'] == 'text/html'
+        assert request._request is None
+
+    def test_full_request(self):
+        request = http.LazyRequest(make_environ())
+        self.assertTrue(isinstance(request.url, url.URL))
+        self.assertTrue(isinstance(request.request, http.Request))
+        assert request.request is request.request
+        assert request.request.environ is request.environ
+
+    def test_setattr(self):
+        request = http.LazyRequest(make_environ())
+        request.foo = 'bar'
+        assert request.foo == 'bar'
+        assert request.request.foo == 'bar'
+
+
 class TestResponseCreation(unittest.TestCase):
 
     def test_init_with_bytes(self):
@@ -0,0 +1,122 @@
+import unittest
+
+from restish import app, http, instrumentation, resource
+from restish.tests.util import wsgi_out
+
+
+class Recorder(instrumentation.Sink):
+
+    def __init__(self):
+        self.calls = []
+
+    def start(self, phase, info):
+        self.calls.append(('start', phase, info['resource'], info['route']))
+        return phase
+
+    def stop(self, phase, info, token):
+        assert token == phase
+        self.calls.append(('stop', phase, info['resource'], info['route']))
+
+
+class Leaf(resource.Resource):
+
+    @resource.GET()
+    def GET(self, request):
+        return http.ok([('Content-Type', 'text/plain')], 'leaf')
+
+
+class Root(resource.Resource):
+
+    @resource.child('users/{id}')
+    def user(self, request, segments, id):
+        return Leaf()
+
+    @resource.child(resource.any)
+    def other(self, request, segments):
+        return Leaf(), []
+
+
+class TestTrace(unittest.TestCase):
+
+    def test_phases(self):
+        sink = Recorder()
+        A = app.RestishApp(Root(), instrumentation=sink)
+        R = wsgi_out(A, http.Request.blank('/users/1').environ)
+        assert R['body'] == 'leaf'
+        assert sink.calls == [
+            ('start', 'locate_resource', None, '/'),
+            ('start', 'resource_child', Root, '/'),
+            ('stop', 'resource_child', Root, '/users/{id}'),
+            ('stop', 'locate_resource', None, '/users/{id}'),
+            ('start', 'get_response', Leaf, '/users/{id}'),
+            ('start', 'dispatch', Leaf, '/users/{id}'),
+            ('stop', 'dispatch', Leaf, '/users/{id}'),
+            ('stop', 'get_response', Leaf, '/users/{id}'),
+            ('start', 'app_iter', Leaf, '/users/{id}'),
+            ('stop', 'app_iter', Leaf, '/users/{id}'),
+            ]
+
+    def test_unknown_pattern(self):
+        sink = Recorder()
+        A = app.RestishApp(Root(), instrumentation=sink)
+        wsgi_out(A, http.Request.blank('/foo/bar').environ)
+        assert sink.calls[-1] == ('stop', 'app_iter', Leaf, '/*')
+
+    def test_not_found(self):
+        sink = Recorder()
+        A = app.RestishApp(Leaf(), instrumentation=sink)
+        R = wsgi_out(A, http.Request.blank('/foo').environ)
+        assert R['status'].startswith('404')
+        assert [call[:2] for call in sink.calls] == [
+            ('start', 'locate_resource'),
+            ('start', 'resource_child'),
+            ('stop', 'resource_child'),
+            ('stop', 'locate_resource'),
+            ('start', 'app_iter'),
+            ('stop', 'app_iter'),
+            ]
+
+    def test_cached_child(self):
+        class Root(resource.Resource):
+            @resource.child('{id}')
+            @resource.cacheable
+            def child(self, request, segments, id):
+                return Leaf()
+        sink = Recorder()
+        A = app.RestishApp(Root(), child_cache_size=10, instrumentation=sink)
+        wsgi_out(A, http.Request.blank('/1').environ)
+        del sink.calls[:]
+        wsgi_out(A, http.Request.blank('/1').environ)
+        assert sink.calls[1] == ('stop', 'locate_resource', None, '/{id}')
+
+    def test_not_installed(self):
+        environ = http.Request.blank('/users/1').environ
+        wsgi_out(app.RestishApp(Root()), environ)
+        assert 'restish.instrumentation' not in environ
+
+
+class TestAggregator(unittest.TestCase):
+
+    def test_report(self):
+        times = iter([0.0, 1.0, 1.0, 4.0, 10.0, 12.0])
+        sink = instrumentation.Aggregator()
+        sink.timer = lambda: times.next()
+        info = {'route': '/users/{id}'}
+        for i in range(3):
+            sink.stop('dispatch', info, sink.start('dispatch', info))
+        assert sink.report() == [('/users/{id}', 'dispatch', 3, 6.0, 3.0)]
+        sink.clear()
+        assert sink.report() == []
+
+    def test_app(self):
+        sink = instrumentation.Aggregator()
+        A = app.RestishApp(Root(), instrumentation=sink)
+        for i in range(2):
+            wsgi_out(A, http.Request.blank('/users/%d' % i).environ)
+        report = dict(((route, phase), count) for (route, phase, count, total, max) in sink.report())
+        assert report == dict((('/users/{id}', phase), 2) for phase in
+                              ['locate_resource', 'resource_child', 'get_response', 'dispatch', 'app_iter'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from restish import _mimeparse as mimeparse
+
+
+BROWSER_ACCEPT = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+
+
+class TestBestMatch(unittest.TestCase):
+
+    def test_browser(self):
+        supported = ['application/json', 'text/html']
+        for i in range(2):
+            assert mimeparse.best_match(supported, BROWSER_ACCEPT) == 'text/html'
+        assert mimeparse.best_match(['application/json'], BROWSER_ACCEPT) == 'application/json'
+        assert mimeparse.best_match(['application/xml', 'application/json'], BROWSER_ACCEPT) == 'application/xml'
+
+    def test_params(self):
+        accept = 'text/*;q=0.3, text/html;q=0.7, text/html;level=1, text/html;level=2;q=0.4, */*;q=0.5'
+        assert mimeparse.best_match(['text/html;level=2', 'text/html;level=1'], accept) == 'text/html;level=1'
+        assert mimeparse.quality('text/html;level=2', accept) == 0.4
+        assert mimeparse.quality('text/html;level=3', accept) == 0.7
+
+    def test_no_match(self):
+        assert mimeparse.best_match(['application/json'], 'text/html') == ''
+
+    def test_no_supported(self):
+        self.assertRaises(IndexError, mimeparse.best_match, [], 'text/html')
+
+    def test_cache_size(self):
+        for i in range(mimeparse.CACHE_SIZE + 1):
+            mimeparse.best_match(['text/html'], 'text/x-%d' % i)
+        assert len(mimeparse._parsed_headers) <= mimeparse.CACHE_SIZE
+
+    def test_parse_media_range_not_shared(self):
+        parsed = mimeparse.parse_media_range('text/html')
+        parsed[2]['q'] = '0'
+        assert mimeparse.best_match(['text/html'], 'text/html') == 'text/html'
+
+
+if __name__ == '__main__':
+    unittest.main()
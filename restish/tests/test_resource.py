@@ -4,6 +4,7 @@
 Test resource behaviour.
 """
 
+import datetime
 import unittest
 
 from restish import app, http, resource, url
@@ -41,6 +42,121 @@ class TestResource(unittest.TestCase):
             assert response.body == method
 
 
+class TestHead(unittest.TestCase):
+
+    def test_implicit(self):
+        class Resource(resource.Resource):
+            @resource.GET(accept='text/plain')
+            def GET(self, request):
+                return http.ok([], request.method)
+        environ = http.Request.blank('/', environ={'REQUEST_METHOD': 'HEAD'}).environ
+        response = Resource()(http.Request(environ))
+        assert response.status == "200 OK"
+        assert response.headers['Content-Type'] == 'text/plain'
+        assert response.body == 'HEAD'
+
+    def test_explicit(self):
+        class Resource(resource.Resource):
+            @resource.GET()
+            def GET(self, request):
+                return http.ok([], 'GET')
+            @resource.HEAD()
+            def HEAD(self, request):
+                return http.ok([], 'HEAD')
+        environ = http.Request.blank('/', environ={'REQUEST_METHOD': 'HEAD'}).environ
+        response = Resource()(http.Request(environ))
+        assert response.body == 'HEAD'
+
+    def test_not_acceptable(self):
+        class Resource(resource.Resource):
+            @resource.GET(accept='text/plain')
+            def GET(self, request):
+                return http.ok([], 'GET')
+        environ = http.Request.blank('/', environ={'REQUEST_METHOD': 'HEAD'},
+                                     headers={'Accept': 'text/html'}).environ
+        response = Resource()(http.Request(environ))
+        assert response.status.startswith("406")
+
+    def test_allow(self):
+        class Resource(resource.Resource):
+            @resource.GET()
+            def GET(self, request):
+                return http.ok([], 'GET')
+        environ = http.Request.blank('/', environ={'REQUEST_METHOD': 'POST'}).environ
+        response = Resource()(http.Request(environ))
+        assert response.status.startswith("405")
+        assert set(response.headers['Allow'].split(', ')) == set(['GET', 'HEAD'])
+
+
+class TestConditionalGet(unittest.TestCase):
+
+    def _resource(self, calls):
+        def etag(resource, request):
+            return 'abc'
+        def last_modified(resource, request):
+            return datetime.datetime(2009, 3, 1, 12, 0, 0, 500)
+        class Resource(resource.Resource):
+            @resource.GET(etag=etag, last_modified=last_modified)
+            def GET(self, request):
+                calls.append(request.method)
+                return http.ok([('Content-Type', 'text/plain')], 'GET')
+        return Resource()
+
+    def _response(self, headers=None, method='GET'):
+        calls = []
+        environ = http.Request.blank('/', environ={'REQUEST_METHOD': method},
+                                     headers=headers).environ
+        response = self._resource(calls)(http.Request(environ))
+        return response, calls
+
+    def test_unconditional(self):
+        response, calls = self._response()
+        assert response.status == "200 OK"
+        assert response.headers['ETag'] == '"abc"'
+        assert response.headers['Last-Modified'] == 'Sun, 01 Mar 2009 12:00:00 GMT'
+        assert calls == ['GET']
+
+    def test_if_none_match(self):
+        for header in ['"abc"', '"xyz", "abc"', 'W/"abc"', '*']:
+            response, calls = self._response({'If-None-Match': header})
+            assert response.status.startswith("304")
+            assert response.headers['ETag'] == '"abc"'
+            assert calls == []
+        response, calls = self._response({'If-None-Match': '"xyz"'})
+        assert response.status == "200 OK"
+        assert calls == ['GET']
+
+    def test_if_modified_since(self):
+        for header in ['Sun, 01 Mar 2009 12:00:00 GMT', 'Mon, 02 Mar 2009 00:00:00 GMT']:
+            response, calls = self._response({'If-Modified-Since': header})
+            assert response.status.startswith("304")
+            assert calls == []
+        response, calls = self._response({'If-Modified-Since': 'Sun, 01 Mar 2009 11:59:59 GMT'})
+        assert response.status == "200 OK"
+        assert calls == ['GET']
+
+    def test_if_none_match_precedence(self):
+        response, calls = self._response({'If-None-Match': '"xyz"',
+                                          'If-Modified-Since': 'Mon, 02 Mar 2009 00:00:00 GMT'})
+        assert response.status == "200 OK"
+        assert calls == ['GET']
+
+    def test_head(self):
+        response, calls = self._response({'If-None-Match': '"abc"'}, method='HEAD')
+        assert response.status.startswith("304")
+        assert calls == []
+
+    def test_unknown_validator(self):
+        class Resource(resource.Resource):
+            @resource.GET(etag=lambda resource, request: None)
+            def GET(self, request):
+                return http.ok([], 'GET')
+        environ = http.Request.blank('/', headers={'If-None-Match': '*'}).environ
+        response = Resource()(http.Request(environ))
+        assert response.status == "200 OK"
+        assert 'ETag' not in response.headers
+
+
 class TestChildLookup(unittest.TestCase):
 
     def test_404(self):
@@ -249,6 +365,150 @@ class TestChildLookup(unittest.TestCase):
         self.fail()
 
 
+class ChildRouterTests(object):
+    """
+    Tests common to the compiled child routers.
+    """
+
+    router = None
+
+    def test_specificity(self):
+        """
+        Check the router finds the same match as the linear search.
+        """
+        def make_resource(body):
+            def resource(request):
+                return http.ok([], body)
+            return resource
+        router = self.router
+        class Resource(resource.Resource):
+            child_router = router
+            @resource.child('a/b/c')
+            def _1(self, request, segments):
+                return make_resource('a/b/c'), []
+            @resource.child('a/b/{c}')
+            def _2(self, request, segments, c):
+                return make_resource('a/b/{c}'), []
+            @resource.child('a/{b}/c/{d}')
+            def _3(self, request, segments, b, d):
+                return make_resource('a/{b}/c/{d}'), []
+            @resource.child('a/b/{c}/{d}')
+            def _4(self, request, segments, c, d):
+                return make_resource('a/b/{c}/{d}'), []
+            @resource.child('a/{b}/{c}')
+            def _5(self, request, segments, b, c):
+                return make_resource('a/{b}/{c}'), []
+            @resource.child('a')
+            def _6(self, request, segments):
+                return make_resource('a'), []
+            @resource.child('{a}/b/c')
+            def _7(self, request, segments, a):
+                return make_resource('{a}/b/c'), []
+            @resource.child(resource.any)
+            def any(self, request, segments):
+                return make_resource('any'), []
+        tests = [
+                ('/a/b/c', 'a/b/c'),
+                ('/a/b/foo', 'a/b/{c}'),
+                ('/a/foo/c/bar', 'a/{b}/c/{d}'),
+                ('/a/b/foo/bar', 'a/b/{c}/{d}'),
+                ('/a/foo/bar', 'a/{b}/{c}'),
+                ('/a', 'a'),
+                ('/foo/b/c', '{a}/b/c'),
+                ('/foo', 'any'),
+                ]
+        A = app.RestishApp(Resource())
+        for path, expected in tests:
+            R = wsgi_out(A, http.Request.blank(path).environ)
+            assert R['body'] == expected
+
+    def test_match_args(self):
+        router = self.router
+        class Resource(resource.Resource):
+            child_router = router
+            def __init__(self, args={}, segments=[]):
+                self.args = args
+                self.segments = segments
+            @resource.child('users/{username}/{page}')
+            def page(self, request, segments, **kwargs):
+                return self.__class__(kwargs, segments), []
+            def __call__(self, request):
+                body = '%r %r' % (sorted(self.args.items()), self.segments)
+                return http.ok([('Content-Type', 'text/plain')], body)
+        A = app.RestishApp(Resource())
+        R = wsgi_out(A, http.Request.blank('/users/foo/edit/more').environ)
+        assert R['body'] == "[('page', u'edit'), ('username', u'foo')] [u'more']"
+        R = wsgi_out(A, http.Request.blank('/users/foo').environ)
+        assert R['status'].startswith('404')
+
+    def test_other_matchers(self):
+        """
+        Check non-template matchers are tried in score order.
+        """
+        class Matcher(object):
+            score = (1, 1)
+            def __call__(self, request, segments):
+                if segments[0] == 'custom':
+                    return [], {}, segments[1:]
+        def make_resource(body):
+            def resource(request):
+                return http.ok([], body)
+            return resource
+        router = self.router
+        class Resource(resource.Resource):
+            child_router = router
+            @resource.child(Matcher())
+            def custom(self, request, segments):
+                return make_resource('custom')
+            @resource.child('{name}')
+            def name(self, request, segments, name):
+                return make_resource('{name}')
+        A = app.RestishApp(Resource())
+        assert wsgi_out(A, http.Request.blank('/custom').environ)['body'] == 'custom'
+        assert wsgi_out(A, http.Request.blank('/other').environ)['body'] == '{name}'
+
+    def test_inherited(self):
+        class Base(resource.Resource):
+            @resource.child()
+            def base(self, request, segments):
+                return lambda request: http.ok([], 'base')
+        router = self.router
+        class Resource(Base):
+            child_router = router
+            @resource.child()
+            def sub(self, request, segments):
+                return lambda request: http.ok([], 'sub')
+        A = app.RestishApp(Resource())
+        assert wsgi_out(A, http.Request.blank('/base').environ)['body'] == 'base'
+        assert wsgi_out(A, http.Request.blank('/sub').environ)['body'] == 'sub'
+
+
+class TestTrieChildRouter(ChildRouterTests, unittest.TestCase):
+    router = resource.TrieChildRouter
+
+
+class TestRegexChildRouter(ChildRouterTests, unittest.TestCase):
+
+    router = resource.RegexChildRouter
+
+    def test_many_patterns(self):
+        """
+        Check patterns are split across regexes when there are lots of groups.
+        """
+        clsattrs = {'child_router': self.router}
+        for i in range(100):
+            def child(self, request, segments, id, i=i):
+                return lambda request: http.ok([], '%d %s' % (i, id))
+            clsattrs['child%d' % i] = resource.child('%d/{id}' % i)(child)
+        Resource = resource._metaResource('Resource', (resource.Resource,),
+                                          clsattrs)
+        assert len(Resource.compiled_child_router.regexes[0][1]) > 1
+        A = app.RestishApp(Resource())
+        for i in [0, 50, 99]:
+            R = wsgi_out(A, http.Request.blank('/%d/foo' % i).environ)
+            assert R['body'] == '%d foo' % i
+
+
 class TestAcceptContentNegotiation(unittest.TestCase):
 
     def test_no_match(self):
@@ -477,6 +737,152 @@ class TestAcceptContentNegotiation(unittest.TestCase):
         self.assertEquals(response.app_iter,['<p>Hello!</p>'])
 
 
+class TestNegotiationCache(unittest.TestCase):
+
+    def setUp(self):
+        resource.negotiation_cache.clear()
+
+    def test_cached(self):
+        class Resource(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], 'html')
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.ok([], 'json')
+        res = Resource()
+        for i in range(3):
+            for accept, body in [('text/html;q=0.9', 'html'), ('application/json;q=0.9', 'json')]:
+                environ = http.Request.blank('/', headers={'Accept': accept}).environ
+                response = res(http.Request(environ))
+                assert response.body == body
+                assert response.headers['Content-Type'] == accept.split(';')[0]
+        cache = resource.negotiation_cache
+        assert (cache.hits, cache.misses) == (4, 2)
+
+    def test_not_acceptable(self):
+        class Resource(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], 'html')
+        for i in range(2):
+            environ = http.Request.blank('/', headers={'Accept': 'application/json, text/plain'}).environ
+            response = Resource()(http.Request(environ))
+            assert response.status.startswith('406')
+        assert resource.negotiation_cache.hits == 1
+
+    def test_content_type_params(self):
+        class Resource(resource.Resource):
+            @resource.POST(content_type='multipart/form-data')
+            def form(self, request):
+                return http.ok([], 'form')
+            @resource.POST(content_type='text/plain')
+            def text(self, request):
+                return http.ok([], 'text')
+        for i in range(3):
+            environ = http.Request.blank('/', environ={'REQUEST_METHOD': 'POST'}, headers={
+                'Content-Type': 'multipart/form-data; boundary=%d' % i}).environ
+            assert Resource()(http.Request(environ)).body == 'form'
+        cache = resource.negotiation_cache
+        assert (cache.hits, cache.misses) == (2, 1)
+        assert len(cache) == 1
+
+    def test_content_type_params_matched(self):
+        class Resource(resource.Resource):
+            @resource.POST(content_type='text/plain;version=1')
+            def v1(self, request):
+                return http.ok([], 'v1')
+            @resource.POST(content_type='text/plain;version=2')
+            def v2(self, request):
+                return http.ok([], 'v2')
+        for version in ['2', '1']:
+            environ = http.Request.blank('/', environ={'REQUEST_METHOD': 'POST'}, headers={
+                'Content-Type': 'text/plain;version=' + version}).environ
+            assert Resource()(http.Request(environ)).body == 'v' + version
+
+    def test_per_class(self):
+        class A(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], 'html')
+        class B(resource.Resource):
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.ok([], 'json')
+        environ = http.Request.blank('/').environ
+        assert A()(http.Request(environ)).headers['Content-Type'] == 'text/html'
+        assert B()(http.Request(environ)).headers['Content-Type'] == 'application/json'
+
+    def test_no_accept_with_accept_list(self):
+        class Resource(resource.Resource):
+            @resource.GET(accept=['text/html', 'application/xhtml+xml'])
+            def html(self, request):
+                return http.ok([], '<html />')
+        environ = http.Request.blank('/').environ
+        response = Resource()(http.Request(environ))
+        assert response.headers['Content-Type'] == 'text/html'
+
+
+class TestNegotiationIndex(unittest.TestCase):
+
+    def setUp(self):
+        resource.negotiation_cache.clear()
+
+    def test_simple_accept(self):
+        """
+        Check a simple Accept header is resolved by the index.
+        """
+        class Resource(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], 'html')
+            @resource.GET(accept='text/*')
+            def text(self, request):
+                return http.ok([], 'text')
+            @resource.GET()
+            def anything(self, request):
+                return http.ok([], 'anything')
+        tests = [
+                ('text/html', 'html', 'text/html'),
+                ('text/plain', 'text', None),
+                ('image/png', 'anything', None),
+                ]
+        for accept, body, content_type in tests:
+            environ = http.Request.blank('/', headers={'Accept': accept}).environ
+            response = Resource()(http.Request(environ))
+            assert response.body == body
+            assert response.headers.get('Content-Type') == content_type
+        cache = resource.negotiation_cache
+        assert (cache.hits, cache.misses) == (0, 0)
+
+    def test_not_acceptable(self):
+        class Resource(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], 'html')
+        environ = http.Request.blank('/', headers={'Accept': 'application/json'}).environ
+        response = Resource()(http.Request(environ))
+        assert response.status.startswith('406')
+
+    def test_subclass(self):
+        """
+        Check a subclass's dispatchers are not added to its super class.
+        """
+        class Base(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], 'html')
+        class Resource(Base):
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.ok([], 'json')
+        assert len(Base.request_dispatchers['GET']) == 1
+        assert len(Resource.request_dispatchers['GET']) == 2
+        environ = http.Request.blank('/', headers={'Accept': 'application/json'}).environ
+        assert Base()(http.Request(environ)).status.startswith('406')
+        assert Resource()(http.Request(environ)).body == 'json'
+
+
 class TestContentTypeContentNegotiation(unittest.TestCase):
 
     def test_any(self):
@@ -711,6 +1117,90 @@ class TestShortAccepts(unittest.TestCase):
         assert response.headers['Content-Type'] == 'unknown'
 
 
+class TestRoutes(unittest.TestCase):
+
+    def test_registered(self):
+        class Root(resource.Resource):
+            @resource.child('test-items', name='test_items')
+            def items(self, request, segments):
+                return Items()
+        class Items(resource.Resource):
+            @resource.child('{id}/edit', name='test_item_edit', parent='test_items')
+            def edit(self, request, segments, id):
+                return Item(id)
+        class Item(resource.Resource):
+            def __init__(self, id):
+                self.id = id
+            def __call__(self, request):
+                return http.ok([], self.id.encode('utf-8'))
+        assert 'test_items' in resource.routes
+        self.assertEquals(resource.routes.path('test_items'), '/test-items')
+        path = resource.routes.path('test_item_edit', id=u'\xa3 1')
+        self.assertEquals(path, '/test-items/%C2%A3%201/edit')
+        self.assertEquals(resource.routes.path('test_item_edit', id='a/b'), '/test-items/a%2Fb/edit')
+        # The path is routed back to the resource.
+        A = app.RestishApp(Root())
+        R = wsgi_out(A, http.Request.blank(path).environ)
+        assert R['body'] == u'\xa3 1'.encode('utf-8')
+
+    def test_path(self):
+        routes = resource.Routes()
+        routes.register('root', '')
+        routes.register('a', 'a b/{b}')
+        routes.register('c', '{c}/%/', parent='a')
+        self.assertEquals(routes.path('root'), '/')
+        self.assertEquals(routes.path('a', b=1), '/a%20b/1')
+        self.assertEquals(routes.path('c', b='x', c='y', d='z'), '/a%20b/x/y/%25/')
+        self.assertRaises(KeyError, routes.path, 'c', b='x')
+        self.assertRaises(KeyError, routes.path, 'd')
+
+    def test_conflict(self):
+        routes = resource.Routes()
+        routes.register('a', 'a')
+        routes.register('b', 'b', parent='a')
+        # Registering the same route again is harmless.
+        routes.register('a', 'a')
+        routes.register('b', 'b', parent='a')
+        self.assertRaises(ValueError, routes.register, 'a', 'z')
+        self.assertRaises(ValueError, routes.register, 'b', 'b')
+        self.assertEquals(routes.path('b'), '/a/b')
+
+    def test_conflicting_resources(self):
+        class A(resource.Resource):
+            @resource.child('test-a', name='test_conflict')
+            def a(self, request, segments):
+                pass
+        def define():
+            class B(resource.Resource):
+                @resource.child('test-b', name='test_conflict')
+                def b(self, request, segments):
+                    pass
+        self.assertRaises(ValueError, define)
+        self.assertEquals(resource.routes.path('test_conflict'), '/test-a')
+
+    def test_cycle(self):
+        routes = resource.Routes()
+        routes.register('a', 'a', parent='b')
+        routes.register('b', 'b', parent='a')
+        self.assertRaises(ValueError, routes.path, 'a')
+
+    def test_url(self):
+        routes = resource.Routes()
+        routes.register('a', '{a}')
+        request = http.Request.blank('/', base_url='http://localhost/app')
+        u = routes.url(request, 'a', a='b')
+        assert isinstance(u, url.URL)
+        self.assertEquals(u, '/app/b')
+
+    def test_not_template(self):
+        def define():
+            class Resource(resource.Resource):
+                @resource.child(resource.any, name='test_any')
+                def any(self, request, segments):
+                    pass
+        self.assertRaises(TypeError, define)
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -3,6 +3,7 @@ import StringIO
 import os
 import tempfile
 import unittest
+from wsgiref.util import FileWrapper
 
 from restish import app, http, resource
 from restish.tests.util import wsgi_out
@@ -57,3 +58,165 @@ class TestStreaming(unittest.TestCase):
         assert f.closed
         os.remove(filename)
 
+
+class TestFileResponse(unittest.TestCase):
+
+    def setUp(self):
+        (fd, self.filename) = tempfile.mkstemp(suffix='.txt')
+        f = os.fdopen(fd, 'w')
+        f.write('file' * 100)
+        f.close()
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_path(self):
+        stat = os.stat(self.filename)
+        response = http.file_response(self.filename)
+        headers = dict(response.headerlist)
+        assert headers['Content-Length'] == '400'
+        assert headers['Content-Type'] == 'text/plain'
+        assert headers['ETag'] == '"%x-%x-%x"' % (stat.st_ino, stat.st_size, int(stat.st_mtime))
+        assert headers['Last-Modified'].endswith(' GMT')
+        assert isinstance(response.app_iter, http.FileIter)
+        R = wsgi_out(app.RestishApp(lambda request: http.file_response(self.filename, block_size=64)),
+                     http.Request.blank('/').environ)
+        assert R['status'].startswith('200')
+        assert R['body'] == 'file' * 100
+
+    def test_file(self):
+        f = open(self.filename, 'rb')
+        f.seek(100)
+        response = http.file_response(f, [('content-type', 'text/x-test'), ('ETag', '"x"')])
+        assert response.headerlist == [('content-type', 'text/x-test'), ('ETag', '"x"'),
+                                       ('Content-Length', '300'),
+                                       ('Last-Modified', response.headers['Last-Modified']),
+                                       ('Accept-Ranges', 'bytes')]
+        assert ''.join(response.app_iter) == 'file' * 75
+        response.app_iter.close()
+        assert f.closed
+
+    def test_file_wrapper(self):
+        A = app.RestishApp(lambda request: http.file_response(self.filename))
+        environ = http.Request.blank('/').environ
+        environ['wsgi.file_wrapper'] = FileWrapper
+        app_iter = A(environ, lambda status, headers: None)
+        assert isinstance(app_iter, FileWrapper)
+        assert ''.join(app_iter) == 'file' * 100
+        app_iter.close()
+        assert app_iter.filelike.closed
+
+    def test_head(self):
+        files = []
+        def resource(request):
+            response = http.file_response(self.filename)
+            files.append(response.app_iter.file)
+            return response
+        R = wsgi_out(app.RestishApp(resource), http.Request.blank('/', environ={'REQUEST_METHOD': 'HEAD'}).environ)
+        assert ('Content-Length', '400') in R['headers']
+        assert R['body'] == ''
+        assert files[0].closed
+
+
+class TestRange(unittest.TestCase):
+
+    def setUp(self):
+        (fd, self.filename) = tempfile.mkstemp(suffix='.txt')
+        f = os.fdopen(fd, 'w')
+        f.write('0123456789' * 10)
+        f.close()
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def _get(self, resource, range, **environ):
+        E = http.Request.blank('/').environ
+        E['HTTP_RANGE'] = range
+        E.update(environ)
+        R = wsgi_out(app.RestishApp(resource), E)
+        R['headers'] = dict(R['headers'])
+        return R
+
+    def test_max_ranges(self):
+        resource = lambda request: http.ok([('Content-Type', 'text/plain')],
+                                           '0123456789' * 10)
+        ranges = ','.join('%d-%d' % (i, i) for i in range(0, 2 * http.MAX_RANGES, 2))
+        R = self._get(resource, 'bytes=' + ranges)
+        assert R['status'].startswith('206')
+        assert R['body'].count('Content-Range') == http.MAX_RANGES
+        # Too many ranges, even overlapping ones, are ignored.
+        for ranges in [ranges + ',98-98', ','.join(['0-0'] * (http.MAX_RANGES + 1))]:
+            R = self._get(resource, 'bytes=' + ranges)
+            assert R['status'].startswith('200')
+            assert R['body'] == '0123456789' * 10
+
+    def test_single(self):
+        files = []
+        def resource(request):
+            response = http.file_response(self.filename)
+            files.append(response.app_iter.file)
+            return response
+        R = self._get(resource, 'bytes=10-14')
+        assert R['status'].startswith('206')
+        assert R['body'] == '01234'
+        assert R['headers']['Content-Range'] == 'bytes 10-14/100'
+        assert R['headers']['Content-Length'] == '5'
+        assert R['headers']['Content-Type'] == 'text/plain'
+        assert files[0].closed
+        assert self._get(resource, 'bytes=-3')['body'] == '789'
+        assert self._get(resource, 'bytes=98-')['body'] == '89'
+        assert self._get(resource, 'bytes=95-200')['headers']['Content-Range'] == 'bytes 95-99/100'
+
+    def test_multiple(self):
+        resource = lambda request: http.file_response(self.filename)
+        R = self._get(resource, 'bytes=50-51, 0-1,1-2, 90-')
+        assert R['status'].startswith('206')
+        content_type = R['headers']['Content-Type']
+        assert content_type.startswith('multipart/byteranges; boundary=')
+        boundary = content_type.split('=', 1)[1]
+        assert int(R['headers']['Content-Length']) == len(R['body'])
+        parts = R['body'].split('\r\n--%s' % boundary)
+        assert parts[0] == '' and parts[-1] == '--\r\n'
+        assert parts[1:-1] == [
+            '\r\nContent-Type: text/plain\r\nContent-Range: bytes 0-2/100\r\n\r\n012',
+            '\r\nContent-Type: text/plain\r\nContent-Range: bytes 50-51/100\r\n\r\n01',
+            '\r\nContent-Type: text/plain\r\nContent-Range: bytes 90-99/100\r\n\r\n0123456789',
+            ]
+
+    def test_not_satisfiable(self):
+        R = self._get(lambda request: http.file_response(self.filename), 'bytes=100-')
+        assert R['status'].startswith('416')
+        assert R['headers']['Content-Range'] == 'bytes */100'
+        response = http.RequestedRangeNotSatisfiableError(None).make_response()
+        assert response.status == '416 Requested Range Not Satisfiable'
+        assert 'Content-Range' not in response.headers
+
+    def test_ignored(self):
+        resource = lambda request: http.file_response(self.filename)
+        for range in ['items=0-1', 'bytes=2-1', 'bytes=a-', 'bytes=-', 'bytes=']:
+            R = self._get(resource, range)
+            assert R['status'].startswith('200'), range
+            assert len(R['body']) == 100
+        R = self._get(lambda request: http.ok([], iter(['abc'])), 'bytes=0-0')
+        assert R['status'].startswith('200')
+        R = self._get(resource, 'bytes=0-0', REQUEST_METHOD='POST')
+        assert R['status'].startswith('200')
+
+    def test_if_range(self):
+        response = http.file_response(self.filename)
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        response.app_iter.close()
+        resource = lambda request: http.file_response(self.filename)
+        assert self._get(resource, 'bytes=0-0', HTTP_IF_RANGE=etag)['status'].startswith('206')
+        assert self._get(resource, 'bytes=0-0', HTTP_IF_RANGE=last_modified)['status'].startswith('206')
+        assert self._get(resource, 'bytes=0-0', HTTP_IF_RANGE='"other"')['status'].startswith('200')
+        assert self._get(resource, 'bytes=0-0', HTTP_IF_RANGE='W/' + etag)['status'].startswith('200')
+
+    def test_seekable(self):
+        R = self._get(lambda request: http.ok([], 'string'), 'bytes=1-2')
+        assert R['body'] == 'tr'
+        stringio = StringIO.StringIO('xxstringio')
+        stringio.seek(2)
+        R = self._get(lambda request: http.ok([], stringio), 'bytes=-2')
+        assert R['body'] == 'io'
+        assert R['headers']['Content-Range'] == 'bytes 6-7/8'
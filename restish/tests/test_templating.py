@@ -1,3 +1,4 @@
+import codecs
 import unittest
 
 from restish import http, resource, templating
@@ -128,6 +129,19 @@ class TestRendering(unittest.TestCase):
         assert response.headers['Content-Type'] == 'text/html; charset=utf-8'
         assert response.body == "page ['element', 'urls']"
 
+    def test_render_response_head(self):
+        rendered = []
+        def renderer(template, args, encoding=None):
+            rendered.append(template)
+            return template
+        request = http.Request.blank('/', environ={'restish.templating': templating.Templating(renderer),
+                                                   'REQUEST_METHOD': 'HEAD'})
+        response = templating.render_response(request, None, 'page')
+        assert response.status == "200 OK"
+        assert response.headers['Content-Type'] == 'text/html; charset=utf-8'
+        assert 'Content-Length' not in response.headers
+        assert rendered == []
+
     def test_encoding(self):
         """
         Check that only a rendered page encoded output by default.
@@ -146,6 +160,96 @@ class TestRendering(unittest.TestCase):
         assert page(None, request).body == 'utf-8'
 
 
+class StreamingRenderer(object):
+
+    def __init__(self):
+        self.rendered = []
+
+    def __call__(self, template, args, encoding=None):
+        return u''.join(self.stream(template, args, encoding))
+
+    def stream(self, template, args, encoding=None):
+        for i in range(args.get('count', 10)):
+            self.rendered.append(i)
+            yield u'%s\xa3%d ' % (template, i)
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_stream_page(self):
+        renderer = StreamingRenderer()
+        request = http.Request.blank('/', environ={'restish.templating': templating.Templating(renderer)})
+        chunks = templating.stream_page(request, None, 'p', chunk_size=10)
+        assert renderer.rendered == []
+        assert chunks.next() == u'p\xa30 p\xa31 '.encode('utf-8')
+        assert renderer.rendered == [0, 1]
+        chunks = list(chunks)
+        assert all(len(chunk) >= 10 for chunk in chunks[:-1])
+        assert ''.join(chunks).decode('utf-8') == u''.join(u'p\xa3%d ' % i for i in range(2, 10))
+
+    def test_chunk_size(self):
+        renderer = StreamingRenderer()
+        T = templating.Templating(renderer)
+        T.chunk_size = 1
+        request = http.Request.blank('/', environ={'restish.templating': T})
+        assert len(list(templating.stream_page(request, None, 'p'))) == 10
+        assert list(templating.stream_page(request, None, 'p', encoding='latin-1', chunk_size=1000)) == \
+                [u''.join(u'p\xa3%d ' % i for i in range(10)).encode('latin-1')]
+
+    def test_not_streaming_renderer(self):
+        rendered = []
+        def renderer(template, args, encoding=None):
+            assert encoding is None
+            rendered.append(template)
+            return u'%s \xa3' % template
+        request = http.Request.blank('/', environ={'restish.templating': templating.Templating(renderer)})
+        chunks = templating.stream_page(request, None, 'page')
+        # Rendered when the first chunk is needed.
+        assert rendered == []
+        assert list(chunks) == [u'page \xa3'.encode('utf-8')]
+        assert rendered == ['page']
+
+    def test_encoded_pieces(self):
+        # Pieces the renderer encoded get no stray BOM from _chunked.
+        class Renderer(object):
+            def stream(self, template, args, encoding=None):
+                return codecs.iterencode([u'a\xa3', u'b'], encoding)
+        request = http.Request.blank('/', environ={'restish.templating': templating.Templating(Renderer())})
+        for encoding in ['utf-8', 'utf-16', 'utf-8-sig']:
+            chunks = templating.stream_page(request, None, 'page', encoding=encoding)
+            assert ''.join(chunks) == u'a\xa3b'.encode(encoding), encoding
+        # Nor do unicode pieces, whose BOM comes with the first piece.
+        request = http.Request.blank('/', environ={'restish.templating': templating.Templating(StreamingRenderer())})
+        body = ''.join(templating.stream_page(request, None, 'p', encoding='utf-16'))
+        assert body == u''.join(u'p\xa3%d ' % i for i in range(10)).encode('utf-16')
+
+    def test_renderer_encoding(self):
+        class Renderer(object):
+            def stream(self, template, args, encoding=None):
+                yield u'\u20ac'.encode(encoding, 'xmlcharrefreplace')
+        request = http.Request.blank('/', environ={'restish.templating': templating.Templating(Renderer())})
+        assert list(templating.stream_page(request, None, 'page', encoding='latin-1')) == ['&#8364;']
+
+    def test_stream_response(self):
+        renderer = StreamingRenderer()
+        request = http.Request.blank('/', environ={'restish.templating': templating.Templating(renderer)})
+        response = templating.stream_response(request, None, 'page', {'count': 2}, type='text/plain')
+        assert response.status == "200 OK"
+        assert response.headers['Content-Type'] == 'text/plain; charset=utf-8'
+        assert 'Content-Length' not in response.headers
+        assert renderer.rendered == []
+        assert ''.join(response.app_iter) == u'page\xa30 page\xa31 '.encode('utf-8')
+
+    def test_stream_response_head(self):
+        renderer = StreamingRenderer()
+        request = http.Request.blank('/', environ={'restish.templating': templating.Templating(renderer),
+                                                   'REQUEST_METHOD': 'HEAD'})
+        response = templating.stream_response(request, None, 'page')
+        assert 'Content-Length' not in response.headers
+        assert list(response.app_iter) == ['']
+        assert renderer.rendered == []
+
+
 class TestPage(unittest.TestCase):
 
     def test_page_decorator(self):
@@ -169,6 +273,18 @@ class TestPage(unittest.TestCase):
         assert response.status.startswith('200')
         assert response.body == '<p>test.html {\'foo\': \'bar\'}</p>'
 
+    def test_page_decorator_stream(self):
+        class Resource(resource.Resource):
+            @resource.GET()
+            @templating.page('p', stream=True, chunk_size=1)
+            def html(self, request):
+                return {'count': 3}
+        environ = {'restish.templating': templating.Templating(StreamingRenderer())}
+        response = Resource()(http.Request.blank('/', environ=environ))
+        assert response.status.startswith('200')
+        assert response.headers['Content-Type'] == 'text/html; charset=utf-8'
+        assert list(response.app_iter) == [(u'p\xa3%d ' % i).encode('utf-8') for i in range(3)]
+
 
 if __name__ == '__main__':
     unittest.main()
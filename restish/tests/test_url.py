@@ -99,6 +99,30 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(url.join_query([('a', '?')]), 'a=%3F')
         self.assertEquals(url.join_query([(POUND, POUND)]), '%C2%A3=%C2%A3')
 
+    def test_memoized(self):
+        # Repeated and cached results are the same, whichever type came first.
+        for i in range(2):
+            self.assertEquals(url.join_path([u'foo', 'foo', POUND]), '/foo/foo/%C2%A3')
+            self.assertEquals(url.split_path('/foo/%C2%A3/a+b'), ['foo', POUND, 'a+b'])
+            self.assertEquals(url.join_query([(u'a b', 'a b'), ('a b', None)]), 'a%20b=a%20b&a%20b')
+            self.assertEquals(url.split_query('a+b=%C2%A3'), [('a b', POUND)])
+        self.assertRaises(UnicodeDecodeError, url.split_path, '/%C2')
+        self.assertRaises(UnicodeDecodeError, url.split_path, '/%C2')
+
+    def test_memo_size(self):
+        size = url.CACHE_SIZE
+        try:
+            url.CACHE_SIZE = 2
+            for segment in ['memo-a', 'memo-b', 'memo-c', 'memo-d']:
+                url.join_path([segment])
+            assert len(url._quote_segment.caches[str]) <= 2
+            url.CACHE_SIZE = 0
+            url._unquote_segment.caches[str].clear()
+            self.assertEquals(url.split_path('/a%20b'), ['a b'])
+            assert not url._unquote_segment.caches[str]
+        finally:
+            url.CACHE_SIZE = size
+
 
 class TestURL(unittest.TestCase):
 
@@ -426,6 +450,33 @@ class TestURL(unittest.TestCase):
         self.failUnless(u != 42, "URL must differ from a number.")
         self.failUnless(u != object(), "URL must be differ from an object.")
 
+    def test_ne_str(self):
+        u = url.URL('http://localhost/?#')
+        self.failIf(u != 'http://localhost/')
+        self.failUnless(u != 'http://localhost/a')
+
+    def test_hash(self):
+        u1 = url.URL('http://localhost/a?#')
+        u2 = url.URL('http://localhost/a')
+        self.assertEquals(u1.canonical, 'http://localhost/a')
+        self.assertEquals(hash(u1), hash(u2))
+        self.assertEquals(hash(u2), hash('http://localhost/a'))
+        cache = {u1: 'a'}
+        self.assertEquals(cache[u2], 'a')
+        self.assertEquals(cache['http://localhost/a'], 'a')
+        assert url.URL('http://localhost/b') not in cache
+
+    def test_intern(self):
+        u = url.intern_url('http://localhost/interned?a')
+        assert url.intern_url('http://localhost/interned?a') is u
+        assert url.intern_url(url.URL('http://localhost/interned?a')) is u
+        assert isinstance(u, url.URL)
+        assert u._hash is not None
+        # Interned by str, not by equality.
+        v = url.intern_url('http://localhost/interned?a#')
+        assert v is not u
+        self.assertEquals(v, 'http://localhost/interned?a#')
+
     def test_parseEqualInParamValue(self):
         S = 'http://localhost/?=x=x=x'
         u = url.URL(S)
@@ -445,6 +496,79 @@ class TestURL(unittest.TestCase):
         assert isinstance(path_qs, url.URL)
         assert path_qs == '/foo?a=b#c'
 
+    def test_lazy_parsing(self):
+        u = url.URL('http://localhost/a/b?c=d')
+        assert u._parsed_url is None
+        self.assertEquals(u.path_segments, ['a', 'b'])
+        assert u.parsed_url is u.parsed_url
+
+    def test_cached_lists(self):
+        u = url.URL('http://localhost/a/b?c=d')
+        segments = u.path_segments
+        segments.append('c')
+        self.assertEquals(u.path_segments, ['a', 'b'])
+        query_list = u.query_list
+        query_list.append(('e', None))
+        self.assertEquals(u.query_list, [('c', 'd')])
+
+    def test_chained(self):
+        u = url.URL('http://localhost/a/').child('b', POUND).sibling('c').child('d')
+        u = u.add_query('e', 'f').add_queries([(POUND, None), ('g', '1=2')]).anchor('h')
+        self.assertEquals(u, 'http://localhost/a/b/c/d?e=f&%C2%A3&g=1=2#h')
+        # The known parts, segments and query list are the same as parsing the
+        # URL would give.
+        parsed = url.URL(str(u))
+        self.assertEquals(u.parsed_url, parsed.parsed_url)
+        self.assertEquals(u.path_segments, parsed.path_segments)
+        self.assertEquals(u.query_list, parsed.query_list)
+        self.assertEquals(u.parent().parent(), 'http://localhost/a/b')
+        self.assertEquals(u.root().child('x').add_query('y'), 'http://localhost/x?y')
+
+    def test_query_index(self):
+        for base in ['http://localhost/?a=1&b&a=%7E&c=%C2%A3#d',
+                     url.URL('http://localhost/').add_queries([('a', '1'), ('b', None), ('a', '~'), ('c', POUND)]).anchor('d')]:
+            u = url.URL(base)
+            self.assertEquals(u.replace_query('a', 2), 'http://localhost/?a=2&b&c=%C2%A3#d')
+            self.assertEquals(u.replace_query(POUND, 2), 'http://localhost/?a=1&b&a=~&c=%C2%A3&%C2%A3=2#d')
+            self.assertEquals(u.remove_query(u'a'), 'http://localhost/?b&c=%C2%A3#d')
+            self.assertEquals(u.remove_query(['a']), 'http://localhost/?a=1&b&a=~&c=%C2%A3#d')
+            self.assertEquals(u.clear_queries('c').replace_query('b', 'x').query_list,
+                              [('a', '1'), ('b', 'x'), ('a', '~')])
+            # The index is made once.
+            assert u._query_index is u._indexed_query()
+
+
+class TestChildURLBuilder(unittest.TestCase):
+
+    def test_child(self):
+        for base in ['http://localhost', 'http://localhost/', 'http://localhost/a?b=c#d',
+                     'http://localhost/a/', '/a', '']:
+            base = url.URL(base)
+            builder = base.child_builder()
+            for segments in [(), ('x',), ('x', POUND), ('',), ('x/y',)]:
+                u = builder.child(*segments)
+                assert isinstance(u, url.URL)
+                self.assertEquals(u, base.child(*segments))
+                self.assertEquals(u.path_segments, base.child(*segments).path_segments)
+
+    def test_query(self):
+        builder = url.URL('http://localhost/a/').child_builder([('b', POUND), ('c', None)])
+        u = builder.child('x')
+        self.assertEquals(u, 'http://localhost/a/x?b=%C2%A3&c')
+        self.assertEquals(u.query_list, [('b', POUND), ('c', None)])
+        self.assertEquals(u.add_query('d', 'e'), 'http://localhost/a/x?b=%C2%A3&c&d=e')
+
+    def test_children(self):
+        builder = url.URL('/items').child_builder([('sort', 'name')])
+        self.assertEquals(builder.children(['1', '2', POUND]),
+                          ['/items/1?sort=name', '/items/2?sort=name', '/items/%C2%A3?sort=name'])
+
+    def test_children_ids(self):
+        builder = url.URL('/items').child_builder()
+        self.assertEquals(builder.children([1, 2L]), ['/items/1', '/items/2'])
+        self.assertEquals(builder.child(3, 'edit'), '/items/3/edit')
+        self.assertEquals(builder.child(4).path_segments, [u'items', u'4'])
+
 
 class Serialization(unittest.TestCase):
 
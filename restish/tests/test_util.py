@@ -0,0 +1,97 @@
+import time
+import unittest
+
+from restish import util
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get(self):
+        cache = util.LRUCache(10)
+        cache['a'] = 1
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('b', 2) == 2
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_bounded(self):
+        cache = util.LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache['c'] = 3
+        assert len(cache) == 2
+        assert 'a' not in cache
+        assert 'b' in cache and 'c' in cache
+
+    def test_least_recently_used(self):
+        cache = util.LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache.get('a')
+        cache['c'] = 3
+        assert 'a' in cache and 'c' in cache
+        assert 'b' not in cache
+        cache['a'] = 4
+        cache['d'] = 5
+        assert cache.get('a') == 4
+        assert 'c' not in cache
+
+    def test_pop(self):
+        cache = util.LRUCache(2)
+        cache['a'] = 1
+        assert cache.pop('a') == 1
+        assert cache.pop('a', 2) == 2
+        assert len(cache) == 0
+        cache['b'] = 2
+        assert cache.get('b') == 2
+
+    def test_maxbytes(self):
+        cache = util.LRUCache(10, maxbytes=10)
+        cache['a'] = 'aaaa'
+        cache['b'] = 'bbbb'
+        assert cache.bytes == 8
+        cache['c'] = 'cccc'
+        assert 'a' not in cache
+        assert cache.bytes == 8
+        # Replacing an item counts its new size only.
+        cache['b'] = 'bb'
+        assert cache.bytes == 6
+        # Too large to store at all.
+        cache['d'] = 'd' * 11
+        assert 'd' not in cache
+        assert len(cache) == 2
+        cache.pop('b')
+        assert cache.bytes == 4
+        cache = util.LRUCache(10, maxbytes=10, sizeof=lambda value: value)
+        cache['a'] = 6
+        cache['b'] = 6
+        assert 'a' not in cache
+
+    def test_clear(self):
+        cache = util.LRUCache(2)
+        cache['a'] = 1
+        cache.get('a')
+        cache.clear()
+        assert len(cache) == 0
+        assert (cache.hits, cache.misses) == (0, 0)
+        cache['b'] = 2
+        assert cache.get('b') == 2
+
+    def test_ttl(self):
+        now = [1000.0]
+        orig_time = time.time
+        time.time = lambda: now[0]
+        try:
+            cache = util.LRUCache(2, ttl=10)
+            cache['a'] = 1
+            now[0] += 5
+            assert cache.get('a') == 1
+            now[0] += 5
+            assert cache.get('a') is None
+            assert len(cache) == 0
+        finally:
+            time.time = orig_time
+
+
+if __name__ == '__main__':
+    unittest.main()
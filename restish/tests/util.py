@@ -3,6 +3,13 @@ def wsgi_out(app, environ):
     def start_response(status, headers):
         out['status'] = status
         out['headers'] = headers
-    out['body'] = ''.join(iter(app(environ, start_response)))
+    app_iter = app(environ, start_response)
+    try:
+        out['body'] = ''.join(iter(app_iter))
+    finally:
+        # Close the app_iter, like a WSGI server would.
+        close = getattr(app_iter, 'close', None)
+        if close is not None:
+            close()
     return out
 
@@ -1,6 +1,9 @@
+import re
 import urlparse
 import urllib
 
+from restish import util
+
 
 # Lists of characters considered "safe", i.e. should not be escape encoded.
 SAFE = '-_.!*\'()~'
@@ -25,6 +28,12 @@ def _encode(S):
     return S
 
 
+# Maximum number of results kept by each of the quoting and unquoting memo
+# caches below, per str and unicode; 0 disables the caches. Segments and query
+# items tend to be short, frequently repeated tokens so are worth remembering.
+CACHE_SIZE = 1024
+
+
 def _quote(S, safe):
     """ urllib quote - see top of module for range of safe definitions """
     return urllib.quote(S, safe)
@@ -35,14 +44,78 @@ def _unquote(S):
     return urllib.unquote_plus(S)
 
 
+def _memoize(func):
+    """
+    Memoize a function of a single str or unicode argument, keeping up to
+    CACHE_SIZE results for each type. Anything else, including subclasses, is
+    passed straight through.
+    """
+    # str and unicode keys are kept apart so a non-ASCII str never has to be
+    # compared with a unicode instance.
+    caches = {str: {}, unicode: {}}
+    def memoized(S):
+        cache = caches.get(type(S))
+        if cache is None or not CACHE_SIZE:
+            return func(S)
+        result = cache.get(S, _UNSET)
+        if result is _UNSET:
+            result = func(S)
+            if len(cache) >= CACHE_SIZE:
+                cache.clear()
+            cache[S] = result
+        return result
+    memoized.caches = caches
+    return memoized
+
+
+def _quoter(safe):
+    """
+    Create a memoized function to UTF-8 encode and quote a segment or query
+    item.
+    """
+    always_safe = urllib.always_safe + safe
+    def quote(S):
+        S = _encode(S)
+        # Nothing to quote, e.g. plain ASCII tokens.
+        if S and not S.rstrip(always_safe):
+            return S
+        return _quote(S, safe)
+    return _memoize(quote)
+
+
+_quote_segment = _quoter(SAFE_SEGMENT)
+_quote_query_name = _quoter(SAFE_QUERY_NAME)
+_quote_query_value = _quoter(SAFE_QUERY_VALUE)
+
+
+@_memoize
+def _unquote_segment(S):
+    """
+    Unquote and decode a path segment.
+    """
+    if '%' in S:
+        S = urllib.unquote(S)
+    return _decode(S)
+
+
+@_memoize
+def _unquote_query(S):
+    """
+    Unquote and decode a query name or value.
+    """
+    if '%' in S or '+' in S:
+        S = _unquote(S)
+    return _decode(S)
+
+
 def split_path(path):
     """
     Split a path of type str into a sequence of unicode segments.
     """
-    segments = [urllib.unquote(segment) for segment in path.split('/')]
+    segments = path.split('/')
     if segments[:1] == ['']:
         segments = segments[1:]
-    return [_decode(S) for S in segments]
+    return [_unquote_segment(S) for S in segments]
 
 
 def join_path(path_segments):
@@ -51,8 +124,7 @@ def join_path(path_segments):
     """
     if not path_segments:
         return ''
-    return '/' + '/'.join([_quote((_encode(seg)), SAFE_SEGMENT)
-        for seg in path_segments])
+    return '/' + '/'.join([_quote_segment(seg) for seg in path_segments])
 
 
 def _split_query(query):
@@ -61,9 +133,9 @@ def _split_query(query):
     """
     for x in query.split('&'):
         if '=' in x:
-            yield tuple(_decode(_unquote(s)) for s in x.split('=', 1))
+            yield tuple(_unquote_query(s) for s in x.split('=', 1))
         elif x:
-            yield (_decode(_unquote(x)), None)
+            yield (_unquote_query(x), None)
 
 
 def split_query(query):
@@ -81,10 +153,9 @@ def join_query(query_list):
     def one(KV):
         (K, V) = KV
         if V is None:
-            return _quote(_encode(K), SAFE_QUERY_NAME)
+            return _quote_query_name(K)
         else:
-            return '%s=%s' % (_quote(_encode(K), SAFE_QUERY_NAME), \
-                              _quote(_encode(V), SAFE_QUERY_VALUE))
+            return '%s=%s' % (_quote_query_name(K), _quote_query_value(V))
     return '&'.join(one(KV) for KV in query_list)
 
 
@@ -96,28 +167,86 @@ class URL(str):
     the same as a str instance (with the possible exception of the equality
     operation) but include attributes to access specific parts of the URL.
 
+    URLs are equal when their parsed parts are equal and hash as their
+    canonical form, so URLs can be used as dict keys, e.g. for caches.
+
     URL instances also include methods to manipulate a URL. Each time a URL is
     modified a new URL instance is resturned.
 
     The URL class tries to be unicode-aware. Unicode path segments and query
     components are UTF-8 encoded on the way in and always returned as unicode
     instances. Note however that the URL itself is a byte string.
+
+    A URL is only parsed when one of its parts is needed and the parsed parts,
+    path segments and query list are remembered. A URL made by manipulating
+    another URL is given the parts, segments or query list already known so
+    is not parsed again. Replacing or removing query arguments finds them by
+    name from an index of the query list and reuses the quoted form of the
+    other arguments.
     """
 
-    def __init__(self, url):
-        """
-        Create a new URL instance from a str URL.
-        """
-        str.__init__(url)
-        self.parsed_url = urlparse.urlsplit(url)
+    # Parsed parts, path segments and query list, set when first needed.
+    _parsed_url = None
+    _path_segments = None
+    _query_list = None
+    # Flags set when the path or query is known to be exactly what join_path
+    # or join_query make from the path segments or query list, allowing
+    # segments or query arguments to be appended without joining everything
+    # again.
+    _path_joined = False
+    _query_joined = False
+    # The query list indexed by name, made when a query argument is replaced
+    # or removed.
+    _query_index = None
+    # Canonical form and its hash, set when first needed.
+    _canonical = None
+    _hash = None
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, URL):
+            # URLs with different canonical forms are never equal.
+            if self._hash is not None and other._hash is not None and \
+                    self._hash != other._hash:
+                return False
             return self.parsed_url == other.parsed_url
         elif isinstance(other, str):
+            # The same str always parses the same.
+            if str.__eq__(self, other):
+                return True
             return self.parsed_url == urlparse.urlsplit(other)
         return False
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        hash_ = self._hash
+        if hash_ is None:
+            hash_ = self._hash = hash(self.canonical)
+        return hash_
+
+    @property
+    def canonical(self):
+        """
+        The url, as a plain str, made from its parsed parts, e.g. without an
+        empty query or fragment. Equal URLs have the same canonical form.
+        """
+        canonical = self._canonical
+        if canonical is None:
+            canonical = self._canonical = urlparse.urlunsplit(self.parsed_url)
+        return canonical
+
+    @property
+    def parsed_url(self):
+        """ The urlparse.SplitResult of the url """
+        parsed_url = self._parsed_url
+        if parsed_url is None:
+            # Note: split a plain str, urlsplit's cache compares its keys.
+            parsed_url = self._parsed_url = urlparse.urlsplit(str(self))
+        return parsed_url
+
     @property
     def scheme(self):
         """ The url scheme (http, https, etc) """
@@ -131,7 +260,8 @@ class URL(str):
     @property
     def path(self):
         """ The path of the url without query string or fragment """
-        return self.__class__(self.parsed_url[2])
+        return self._derive(('', '', self.parsed_url[2], '', ''),
+                            self._path_segments, (), self._path_joined, True)
 
     @property
     def path_qs(self):
@@ -141,7 +271,11 @@ class URL(str):
     @property
     def path_segments(self):
         """ A list of url segments """
-        return split_path(self.path)
+        path_segments = self._path_segments
+        if path_segments is None:
+            path_segments = self._path_segments = \
+                    tuple(split_path(self.parsed_url[2]))
+        return list(path_segments)
 
     @property
     def query(self):
@@ -151,7 +285,11 @@ class URL(str):
     @property
     def query_list(self):
         """ The query parameters as a list of tuples """
-        return split_query(self.query)
+        query_list = self._query_list
+        if query_list is None:
+            query_list = self._query_list = \
+                    tuple(split_query(self.parsed_url[3]))
+        return list(query_list)
 
     @property
     def fragment(self):
@@ -170,18 +308,54 @@ class URL(str):
         :arg query:
         :arg fragment:
         """
+        return self._clone(scheme, netloc, path, query, fragment)
+
+    def _clone(self, scheme=_UNSET, netloc=_UNSET, path=_UNSET, \
+               query=_UNSET, fragment=_UNSET, path_segments=None, \
+               query_list=None):
+        """
+        Make a new instance of self, like clone(), passing along the path
+        segments and query list of the new instance if known.
+        """
         scheme_, netloc_, path_, query_, fragment_ = self.parsed_url
         if scheme is not _UNSET:
             scheme_ = scheme
         if netloc is not _UNSET:
             netloc_ = netloc
-        if path is not _UNSET:
+        if path is _UNSET:
+            path_segments = self._path_segments
+            path_joined = self._path_joined
+        else:
             path_ = path
-        if query is not _UNSET:
+            path_joined = path_segments is not None
+        if query is _UNSET:
+            query_list = self._query_list
+            query_joined = self._query_joined
+        else:
             query_ = query
+            query_joined = query_list is not None
         if fragment is not _UNSET:
             fragment_ = fragment
-        return self.__class__(urlparse.urlunsplit((scheme_, netloc_, path_, query_, fragment_)))
+        return self._derive((scheme_ or '', netloc_ or '', path_ or '', \
+                             query_ or '', fragment_ or ''), \
+                            path_segments, query_list, path_joined, \
+                            query_joined)
+
+    def _derive(self, parts, path_segments=None, query_list=None, \
+                path_joined=False, query_joined=False):
+        """
+        Make a new instance of self from the (scheme, netloc, path, query,
+        fragment) parts, remembering the parts, if parsing the new URL would
+        give the same parts, and the path segments and query list.
+        """
+        url = self.__class__(urlparse.urlunsplit(parts))
+        if _is_round_trip(parts):
+            url._parsed_url = urlparse.SplitResult(*parts)
+            url._path_segments = path_segments
+            url._query_list = query_list
+            url._path_joined = path_joined
+            url._query_joined = query_joined
+        return url
     
     ## path manipulations ##
 
@@ -189,7 +363,7 @@ class URL(str):
         """
         Contruct a URL to the root of the web server.
         """
-        return self.clone(path='/', query=None, fragment=None)
+        return self._clone_path('', (), [''])
 
     def sibling(self, segment):
         """
@@ -197,18 +371,28 @@ class URL(str):
         """
         l = list(self.path_segments)
         l[-1] = segment
-        return self.clone(path=join_path(l), query=None, fragment=None)
+        if self._path_joined:
+            path = self.parsed_url[2]
+            return self._clone_path(path[:path.rindex('/')], \
+                                    self._path_segments[:-1], [segment])
+        return self._clone_path('', (), l)
 
     def child(self, *path):
         """
         Construct a url where the given path segment is a child of this url
         """
+        if self._path_joined:
+            # Replace a trailing empty segment, i.e. the path's trailing '/'.
+            path_, path_segments = self.parsed_url[2], self._path_segments
+            if path_segments[-1:] == (u'',):
+                path_, path_segments = path_[:-1], path_segments[:-1]
+            return self._clone_path(path_, path_segments, path)
         l = list(self.path_segments)
         if l[-1:] == ['']:
             l[-1:] = path
         else:
             l.extend(path)
-        return self.clone(path=join_path(l), query=None, fragment=None)
+        return self._clone_path('', (), l)
 
     def parent(self):
         """
@@ -216,7 +400,22 @@ class URL(str):
         """
         l = list(self.path_segments)
         l.pop()
-        return self.clone(path=join_path(l), query=None, fragment=None)
+        if self._path_joined:
+            path = self.parsed_url[2]
+            return self._clone_path(path[:path.rindex('/')], \
+                                    self._path_segments[:-1], [])
+        return self._clone_path('', (), l)
+
+    def _clone_path(self, path, path_segments, extra_segments):
+        """
+        Make a new instance of self, with no query or fragment, whose path is
+        made by appending the extra segments to the path. path must have been
+        joined from path_segments.
+        """
+        path_segments = _normalise_segments(path_segments, extra_segments)
+        return self._clone(path=path + join_path(extra_segments), \
+                           query=None, fragment=None, \
+                           path_segments=path_segments, query_list=())
     
     def click(self, href):
         """
@@ -262,9 +461,7 @@ class URL(str):
         """
         if value is not None:
             value = unicode(value)
-        q = list(self.query_list)
-        q.append((name, value))
-        return self.clone(query=join_query(q))
+        return self.add_queries([(name, value)])
     
     def add_queries(self, query_list):
         """
@@ -272,9 +469,15 @@ class URL(str):
 
         :arg query_list: list of tuple (key, value) pairs
         """
-        q = list(self.query_list)
-        q.extend(query_list)
-        return self.clone(query=join_query(q))
+        query_list = list(query_list)
+        if self._query_joined:
+            query, q = self.parsed_url[3], self._query_list
+        else:
+            query, q = '', ()
+            query_list = self.query_list + query_list
+        if q and query_list:
+            query += '&'
+        return self._clone_query(query, q, query_list)
 
     def replace_query(self, name, value=None):
         """
@@ -286,16 +489,21 @@ class URL(str):
         """
         if value is not None:
             value = unicode(value)
-        ql = self.query_list
         ## Preserve the original position of the query key in the list
-        i = 0
-        for (k, v) in ql:
-            if k == name:
-                break
-            i += 1
-        q = filter(lambda x: x[0] != name, ql)
-        q.insert(i, (name, value))
-        return self.clone(query=join_query(q))
+        index = self._indexed_query()
+        positions = index.positions(name)
+        query_list, pieces = index.without(positions)
+        if positions:
+            i = positions[0]
+        else:
+            i = len(query_list)
+        pieces.insert(i, join_query([(name, value)]))
+        normalised = _normalise_query((), [(name, value)])
+        if normalised is None:
+            query_list = None
+        else:
+            query_list[i:i] = normalised
+        return self._clone_query_pieces(pieces, query_list)
 
     def remove_query(self, name):
         """
@@ -303,8 +511,9 @@ class URL(str):
 
         :arg name: the name of the query arguments to remove
         """
-        q = filter(lambda x: x[0] != name, self.query_list)
-        return self.clone(query=join_query(q))
+        index = self._indexed_query()
+        query_list, pieces = index.without(index.positions(name))
+        return self._clone_query_pieces(pieces, query_list)
 
     def clear_queries(self, name=None):
         """
@@ -313,10 +522,44 @@ class URL(str):
         :arg name: the name of the query arguments to remove, defaults to removing all
         """
         if name is None:
-            q = []
-        else:
-            q = filter(lambda x: x[0] != name, self.query_list)
-        return self.clone(query=join_query(q))
+            return self._clone_query('', (), [])
+        return self.remove_query(name)
+
+    def _indexed_query(self):
+        """
+        Return the _QueryIndex of the query, made once per instance.
+        """
+        index = self._query_index
+        if index is None:
+            query_list = self._query_list
+            if query_list is None:
+                query_list = tuple(self.query_list)
+            if self._query_joined:
+                query = self.parsed_url[3]
+                pieces = query and query.split('&') or []
+            else:
+                pieces = [join_query([KV]) for KV in query_list]
+            index = self._query_index = _QueryIndex(query_list, pieces)
+        return index
+
+    def _clone_query_pieces(self, pieces, query_list):
+        """
+        Make a new instance of self whose query is joined from the quoted query
+        arguments, pieces, of the already normalised query_list, if known.
+        """
+        if query_list is not None:
+            query_list = tuple(query_list)
+        return self._clone(query='&'.join(pieces), query_list=query_list)
+
+    def _clone_query(self, query, query_list, extra_query_list):
+        """
+        Make a new instance of self whose query is made by appending the extra
+        query arguments to the query. query must have been joined from
+        query_list, followed by a '&' if both lists are not empty.
+        """
+        query_list = _normalise_query(query_list, extra_query_list)
+        return self._clone(query=query + join_query(extra_query_list), \
+                           query_list=query_list)
     
     ## scheme manipulation ##
 
@@ -351,6 +594,201 @@ class URL(str):
         """
         return self.clone(fragment=anchor)
 
+    ## batch manipulation ##
+
+    def child_builder(self, query_list=None):
+        """
+        Return a ChildURLBuilder to make many children of this url, e.g. for
+        the rows of a listing.
+
+        :arg query_list: optional list of (key, value) query args added to
+                         every child.
+        """
+        return ChildURLBuilder(self, query_list)
+
+
+# Interned URLs, by their str, see intern_url.
+interned = util.LRUCache(1024)
+
+
+def intern_url(value):
+    """
+    Return a shared URL instance for the URL str value, from the interned
+    cache if the same URL has been interned recently.
+
+    An interned URL remembers its parsed parts, path segments, query list and
+    hash so they are worked out once for frequently seen URLs, e.g. when used
+    as cache keys.
+    """
+    key = str(value)
+    u = interned.get(key)
+    if u is None:
+        if type(value) is URL:
+            u = value
+        else:
+            u = URL(key)
+        hash(u)
+        interned[key] = u
+    return u
+
+
+class ChildURLBuilder(object):
+    """
+    Builder of child URLs of a base URL.
+
+    builder.child(*segments) makes the same URL as
+    base.child(*segments).add_queries(query_list) but only the given segments
+    are quoted, the base URL's path and the query are joined once when the
+    builder is created.
+    """
+
+    def __init__(self, url, query_list=None):
+        # The child with no segments has the path to append segments to.
+        self.template = url.child().add_queries(query_list or [])
+        # Cache the template's parts.
+        self.template.path_segments
+        self.template.query_list
+
+    def child(self, *segments):
+        """
+        Construct a url where the given path segments are a child of the base
+        url, with the builder's query args. Segments that are not strings,
+        e.g. int ids, are converted to unicode.
+        """
+        segments = [_segment(segment) for segment in segments]
+        template = self.template
+        scheme, netloc, path, query, fragment = template.parsed_url
+        if template._path_joined:
+            path_segments = _normalise_segments(template._path_segments, \
+                                                segments)
+        else:
+            path_segments = None
+        return template._derive((scheme, netloc, path + join_path(segments), \
+                                 query, ''), \
+                                path_segments, template._query_list, \
+                                path_segments is not None, \
+                                template._query_joined)
+
+    def children(self, items):
+        """
+        Return a list of child urls, one for each path segment in items,
+        converted to unicode if not a string.
+        """
+        child = self.child
+        return [child(item) for item in items]
+
+
+def _segment(value):
+    """
+    Return the value, converted to unicode if not a string, as a segment.
+    """
+    if not isinstance(value, basestring):
+        return unicode(value)
+    return value
+
+
+class _QueryIndex(object):
+    """
+    A URL's query list, with the quoted form of each query argument, as
+    joined by join_query, and the positions of the query arguments by name.
+    """
+
+    def __init__(self, query_list, pieces):
+        self.query_list = query_list
+        self.pieces = pieces
+        self.names = names = {}
+        for i, (name, value) in enumerate(query_list):
+            positions = names.get(name)
+            if positions is None:
+                names[name] = [i]
+            else:
+                positions.append(i)
+
+    def positions(self, name):
+        """
+        Return the positions of the query arguments with the given name.
+        """
+        try:
+            return self.names.get(name, [])
+        except TypeError:
+            # Unhashable names are never equal to a query argument's name.
+            return []
+
+    def without(self, positions):
+        """
+        Return new lists of the query arguments and their quoted forms, without
+        the arguments at the given positions.
+        """
+        query_list, pieces = [], []
+        start = 0
+        for i in positions:
+            query_list.extend(self.query_list[start:i])
+            pieces.extend(self.pieces[start:i])
+            start = i + 1
+        query_list.extend(self.query_list[start:])
+        pieces.extend(self.pieces[start:])
+        return query_list, pieces
+
+
+def _is_round_trip(parts):
+    """
+    Test if parsing the URL made from the parts gives the same parts.
+    """
+    scheme, netloc, path, query, fragment = parts
+    # urlunsplit adds a '/' or '//' to some paths and the path, query and
+    # fragment delimiters are not escaped.
+    if path and (path[0] != '/' or path[:2] == '//'):
+        return False
+    if '?' in path or '#' in path or '#' in query:
+        return False
+    if scheme and not _SCHEME.match(scheme):
+        return False
+    if '/' in netloc or '?' in netloc or '#' in netloc:
+        return False
+    return True
+
+
+# A scheme that urlsplit will recognise.
+_SCHEME = re.compile(r'^[a-zA-Z][a-zA-Z0-9+\-.]*$')
+
+
+def _normalise_segments(path_segments, extra_segments):
+    """
+    Return the already normalised path segments extended by the extra
+    segments as split_path would return them from join_path, or None if
+    that's not known.
+    """
+    if path_segments is None:
+        return None
+    try:
+        return path_segments + \
+                tuple([_decode(_encode(segment)) for segment in extra_segments])
+    except (UnicodeError, AttributeError):
+        return None
+
+
+def _normalise_query(query_list, extra_query_list):
+    """
+    Return the already normalised query list extended by the extra query
+    arguments as split_query would return them from join_query, or None if
+    that's not known.
+    """
+    if query_list is None:
+        return None
+    extra = []
+    for name, value in extra_query_list:
+        # An empty name without a value is dropped by split_query.
+        if not name and value is None:
+            return None
+        try:
+            name = _decode(_encode(name))
+            if value is not None:
+                value = _decode(_encode(value))
+        except (UnicodeError, AttributeError):
+            return None
+        extra.append((name, value))
+    return query_list + tuple(extra)
+
 
 class URLAccessor(object):
     """
@@ -1,6 +1,8 @@
 """
 General-purpose utilities.
 """
+import threading
+import time
 
 
 class RequestBoundCallable(object):
@@ -24,3 +26,149 @@ class RequestBoundCallable(object):
     def __getitem__(self, name):
         return self.callable[name]
 
+
+class LRUCache(object):
+    """
+    A size-bounded, thread-safe mapping that discards the least recently used
+    item when full.
+
+    The number of lookups that found (hits) and did not find (misses) an item
+    are counted to help tune the size of the cache.
+
+    :arg maxsize:
+        Maximum number of items.
+    :arg ttl:
+        Optional number of seconds an item lives for, defaults to None, i.e.
+        items live until they are discarded to make room for another item.
+    :arg maxbytes:
+        Optional maximum total size of the items, measured by sizeof. Items
+        larger than maxbytes are not stored. Defaults to None, i.e. bounded by
+        the number of items only.
+    :arg sizeof:
+        Function returning the size of an item's value, defaults to len.
+    """
+
+    def __init__(self, maxsize, ttl=None, maxbytes=None, sizeof=len):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        # Map of key to [prev, next, key, value, expires, size] links in a
+        # circular, doubly linked list, ordered from least to most recently
+        # used.
+        self._links = {}
+        self._root = root = []
+        root[:] = [root, root, None, None, None, 0]
+        # Total size of the items, when bounded by maxbytes.
+        self.bytes = 0
+
+    def get(self, key, default=None):
+        """
+        Return the item for key, or default if there is no such item.
+        """
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is not None and link[4] is not None and \
+                    link[4] <= time.time():
+                self._remove(link)
+                link = None
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._move_to_end(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def __setitem__(self, key, value):
+        if self.maxsize <= 0:
+            return
+        if self.ttl is None:
+            expires = None
+        else:
+            expires = time.time() + self.ttl
+        maxbytes = self.maxbytes
+        if maxbytes is None:
+            size = 0
+        else:
+            size = self.sizeof(value)
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is not None:
+                self._remove(link)
+            if maxbytes is not None and size > maxbytes:
+                return
+            while len(self._links) >= self.maxsize or \
+                    (maxbytes is not None and self.bytes + size > maxbytes):
+                self._remove(self._root[1])
+            root = self._root
+            last = root[0]
+            link = [last, root, key, value, expires, size]
+            last[1] = root[0] = self._links[key] = link
+            self.bytes += size
+        finally:
+            self._lock.release()
+
+    def pop(self, key, default=None):
+        """
+        Remove the item for key and return it, or default if there is no such
+        item.
+        """
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is None:
+                return default
+            self._remove(link)
+            if link[4] is not None and link[4] <= time.time():
+                return default
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def __contains__(self, key):
+        link = self._links.get(key)
+        return link is not None and (link[4] is None or link[4] > time.time())
+
+    def __len__(self):
+        return len(self._links)
+
+    def clear(self):
+        """
+        Remove all items and reset the hit and miss counters.
+        """
+        self._lock.acquire()
+        try:
+            self._clear()
+            self.hits = 0
+            self.misses = 0
+        finally:
+            self._lock.release()
+
+    def _remove(self, link):
+        """
+        Remove the link from the list.
+        """
+        link[0][1], link[1][0] = link[1], link[0]
+        del self._links[link[2]]
+        self.bytes -= link[5]
+
+    def _move_to_end(self, link):
+        """
+        Move the link to the most recently used end of the list.
+        """
+        prev, next = link[0], link[1]
+        prev[1], next[0] = next, prev
+        root = self._root
+        last = root[0]
+        link[0], link[1] = last, root
+        last[1] = root[0] = link